@@ -0,0 +1,113 @@
+# attack maps: the squares each side and each piece type attacks, built once
+# per node from the bitboards and shared by evaluation, SEE and move ordering
+import chess
+from pawns import pawn_attacks
+
+# per safe square a piece attacks, by piece type
+MOBILITY_WEIGHTS = [0, 0, 4, 3, 2, 1, 0]
+# per square of the enemy king zone a piece attacks, by piece type
+KING_ZONE_WEIGHTS = [0, 0, 6, 6, 8, 12, 0]
+
+
+class AttackMap:
+    __slots__ = ("by_type", "by_color", "mobility", "king_danger")
+
+    def __init__(self, board):
+        """
+        by_type[color][piece_type]: squares attacked by that side's pieces
+        of that type, by_color[color]: everything that side attacks
+        mobility, king_danger: evaluation terms, white positive
+        """
+        occupied = board.occupied
+        knights = board.knights
+        diagonal = board.bishops | board.queens
+        straight = board.rooks | board.queens
+        queens = board.queens
+        kings = board.kings
+        pawns = (pawn_attacks(chess.BLACK, board.pawns & board.occupied_co[chess.BLACK]),
+                 pawn_attacks(chess.WHITE, board.pawns & board.occupied_co[chess.WHITE]))
+        king_squares = [(kings & board.occupied_co[color]).bit_length() - 1 for color in (chess.BLACK, chess.WHITE)]
+        zones = [chess.BB_KING_ATTACKS[square] | chess.BB_SQUARES[square] if square >= 0 else 0
+                 for square in king_squares]
+        knight_attacks = chess.BB_KNIGHT_ATTACKS
+        diag_attacks = chess.BB_DIAG_ATTACKS
+        diag_masks = chess.BB_DIAG_MASKS
+        rank_attacks = chess.BB_RANK_ATTACKS
+        rank_masks = chess.BB_RANK_MASKS
+        file_attacks = chess.BB_FILE_ATTACKS
+        file_masks = chess.BB_FILE_MASKS
+
+        self.by_type = [None, None]
+        self.by_color = [0, 0]
+        self.mobility = 0
+        self.king_danger = 0
+        _, _, knight_mobility, bishop_mobility, rook_mobility, queen_mobility, _ = MOBILITY_WEIGHTS
+        _, _, knight_danger, bishop_danger, rook_danger, queen_danger, _ = KING_ZONE_WEIGHTS
+        for color in (chess.BLACK, chess.WHITE):
+            ours = board.occupied_co[color]
+            # squares worth going to: not our own and not hit by their pawns
+            safe = ~ours & ~pawns[not color]
+            zone = zones[not color]
+            knight_bb = bishop_bb = rook_bb = queen_bb = 0
+            mobility = 0
+            danger = 0
+
+            bb = knights & ours
+            while bb:
+                square = (bb & -bb).bit_length() - 1
+                bb &= bb - 1
+                attacks = knight_attacks[square]
+                knight_bb |= attacks
+                mobility += knight_mobility * (attacks & safe).bit_count()
+                danger += knight_danger * (attacks & zone).bit_count()
+
+            bb = diagonal & ours
+            while bb:
+                square = (bb & -bb).bit_length() - 1
+                bb &= bb - 1
+                attacks = diag_attacks[square][diag_masks[square] & occupied]
+                if queens & (1 << square):
+                    # the straight half gets added below
+                    queen_bb |= attacks
+                    continue
+                bishop_bb |= attacks
+                mobility += bishop_mobility * (attacks & safe).bit_count()
+                danger += bishop_danger * (attacks & zone).bit_count()
+
+            bb = straight & ours
+            while bb:
+                square = (bb & -bb).bit_length() - 1
+                bb &= bb - 1
+                attacks = (rank_attacks[square][rank_masks[square] & occupied]
+                           | file_attacks[square][file_masks[square] & occupied])
+                if queens & (1 << square):
+                    attacks |= diag_attacks[square][diag_masks[square] & occupied]
+                    queen_bb |= attacks
+                    mobility += queen_mobility * (attacks & safe).bit_count()
+                    danger += queen_danger * (attacks & zone).bit_count()
+                else:
+                    rook_bb |= attacks
+                    mobility += rook_mobility * (attacks & safe).bit_count()
+                    danger += rook_danger * (attacks & zone).bit_count()
+
+            king_bb = chess.BB_KING_ATTACKS[king_squares[color]] if king_squares[color] >= 0 else 0
+            self.by_type[color] = [0, pawns[color], knight_bb, bishop_bb, rook_bb, queen_bb, king_bb]
+            self.by_color[color] = pawns[color] | knight_bb | bishop_bb | rook_bb | queen_bb | king_bb
+            if color:
+                self.mobility += mobility
+                self.king_danger += danger
+            else:
+                self.mobility -= mobility
+                self.king_danger -= danger
+
+    def is_defended(self, board, move):
+        """
+        Can the other side take back on move's target square? Also True
+        whenever moving the piece (or an en passant capture) could open a
+        line onto it, see() sorts those out.
+        """
+        them = not board.turn
+        if self.by_color[them] & chess.BB_SQUARES[move.to_square] or move.to_square == board.ep_square:
+            return True
+        sliders = (board.bishops | board.rooks | board.queens) & board.occupied_co[them]
+        return bool(chess.BB_RAYS[move.from_square][move.to_square] & sliders)
@@ -0,0 +1,208 @@
+# fixed depth benchmark for TreeEngine, run with: python bench.py [depth] [smp|eval|verify|elo]
+import math
+import random
+import sys
+import time
+import chess
+import evaluation
+import material
+import zobrist
+from attacks import AttackMap
+from engines import TreeEngine
+from smp import SMPTreeEngine
+
+BENCH_POSITIONS = [
+    chess.STARTING_FEN,
+    "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 0 1",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "r1bq1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N1PN2/PP1B1PPP/R2QKB1R w KQ - 0 8",
+    "r2q1rk1/1b2bppp/p2p1n2/1p2p3/3NP3/1BN5/PPP2PPP/R2Q1RK1 w - - 0 12",
+    "2r3k1/pp3ppp/2n1b3/3p4/3P4/2PB1N2/P4PPP/4R1K1 w - - 0 20",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+    "6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1",
+    "8/8/4k3/8/2P5/8/4K3/8 w - - 0 1",
+    "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+]
+
+
+def run(depth=4, hash_size_mb=16):
+    total_nodes = 0
+    total_qnodes = 0
+    total_time = 0
+    total_cutoffs = 0
+    total_first = 0
+    pawn_probes = 0
+    pawn_hits = 0
+
+    for fen in BENCH_POSITIONS:
+        engine = TreeEngine(hash_size_mb)
+        engine.max_depth = depth
+        board = chess.Board(fen)
+
+        start = time.perf_counter()
+        move, score = engine.iterative_deepening(board, None)
+        elapsed = time.perf_counter() - start
+
+        nodes = engine.nodes_searched
+        qnodes = engine.qnodes_searched
+        first_rate = engine.first_move_cutoffs / max(1, engine.beta_cutoffs)
+        print(f"{fen:<75} {str(move):>6} {score:>7} {nodes:>7} nodes {qnodes:>7} qnodes {elapsed:6.2f}s  first move cutoffs {first_rate:.1%}")
+        ebf = " ".join(f"{stats[4]:.1f}" for stats in engine.iteration_stats[1:])
+        print(f"    branching factor per iteration: {ebf}, hash full {engine.tt.hashfull() / 10:.1f}%")
+
+        total_nodes += nodes
+        total_qnodes += qnodes
+        total_time += elapsed
+        total_cutoffs += engine.beta_cutoffs
+        total_first += engine.first_move_cutoffs
+        pawn_probes += engine.pawn_table.probes
+        pawn_hits += engine.pawn_table.hits
+
+    print(f"\nTotal: {total_nodes} nodes + {total_qnodes} qnodes in {total_time:.2f}s "
+          f"({(total_nodes + total_qnodes) / total_time:.0f} nps), "
+          f"first move cutoffs {total_first / max(1, total_cutoffs):.1%}, "
+          f"pawn table hits {pawn_hits / max(1, pawn_probes):.1%}")
+
+
+def run_smp(depth=4, hash_size_mb=16, workers=(1, 2, 4)):
+    """
+    Time to depth with lazy SMP, the speedup only means something with at
+    least as many free cores as workers
+    """
+    for count in workers:
+        engine = SMPTreeEngine(count, hash_size_mb)
+        engine.max_depth = depth
+        total_time = 0
+        total_nodes = 0
+        for fen in BENCH_POSITIONS:
+            engine.new_game()
+            start = time.perf_counter()
+            engine.iterative_deepening(chess.Board(fen), None)
+            total_time += time.perf_counter() - start
+            total_nodes += engine.nodes_searched + engine.qnodes_searched + engine.helper_nodes
+        engine.close()
+        print(f"{count} workers: depth {depth} in {total_time:.2f}s, {total_nodes} nodes")
+
+
+def elo_difference(score):
+    """Elo difference that a score fraction corresponds to"""
+    score = min(max(score, 1e-3), 1 - 1e-3)
+    return -400 * math.log10(1 / score - 1) + 0.0
+
+
+def play_game(white, black, fen, think_time, max_plies):
+    """One game between two engines, returns white's score (1, 0.5 or 0)"""
+    board = chess.Board(fen)
+    white.new_game()
+    black.new_game()
+    while not board.is_game_over(claim_draw=True) and board.ply() < max_plies:
+        engine = white if board.turn == chess.WHITE else black
+        move, _ = engine.iterative_deepening(board, think_time)
+        board.push(move if move is not None else next(iter(board.legal_moves)))
+    outcome = board.outcome(claim_draw=True)
+    if outcome is None or outcome.winner is None:
+        return 0.5
+    return 1.0 if outcome.winner == chess.WHITE else 0.0
+
+
+def run_elo(workers=(2, 4), think_time=0.1, max_plies=160, hash_size_mb=16):
+    """
+    Elo gain of lazy SMP: SMP(N) plays SMP(1) at a fixed time per move, each
+    bench position (without the endgames) once with each colour. Like the
+    time to depth run this only means something with N free cores.
+    """
+    openings = BENCH_POSITIONS[:6] + BENCH_POSITIONS[9:]
+    baseline = SMPTreeEngine(1, hash_size_mb)
+    for count in workers:
+        engine = SMPTreeEngine(count, hash_size_mb)
+        results = []
+        for fen in openings:
+            results.append(play_game(engine, baseline, fen, think_time, max_plies))
+            results.append(1.0 - play_game(baseline, engine, fen, think_time, max_plies))
+        engine.close()
+
+        games = len(results)
+        score = sum(results) / games
+        deviation = math.sqrt(sum((result - score) ** 2 for result in results) / games)
+        margin = 1.96 * deviation / math.sqrt(games)
+        low, high = elo_difference(score - margin), elo_difference(score + margin)
+        print(f"{count} workers vs 1: {sum(results):.1f}/{games} ({score:.1%}), "
+              f"Elo {elo_difference(score):+.0f} (95% {low:+.0f} to {high:+.0f}) at {think_time}s per move")
+    baseline.close()
+
+
+def run_eval(repeat=5):
+    """
+    Cost of one leaf evaluation with and without the attack map terms,
+    over every position two plies from the bench positions
+    """
+    engine = TreeEngine()
+    leaves = []
+    for fen in BENCH_POSITIONS:
+        board = chess.Board(fen)
+        for move in list(board.legal_moves):
+            board.push(move)
+            for reply in list(board.legal_moves):
+                board.push(reply)
+                leaf = board.copy(stack=False)
+                leaves.append((leaf, evaluation.packed_score(leaf), material.material_key(leaf), zobrist.pawn_hash(leaf)))
+                board.pop()
+            board.pop()
+
+    for label, with_attacks in (("without attack map", False), ("with attack map", True)):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for leaf, score, material_key, pawn_hash in leaves:
+                engine.score, engine.material_key, engine.pawn_hash = score, material_key, pawn_hash
+                signature = material.material_entry(material_key)
+                engine.static_eval(leaf, signature, AttackMap(leaf) if with_attacks else None)
+        elapsed = time.perf_counter() - start
+        print(f"{label}: {elapsed / (repeat * len(leaves)) * 1e6:.1f}us per leaf over {len(leaves)} leaves")
+
+
+def run_verify(games=10, max_plies=150, depth=3):
+    """
+    Check the incremental hash, score, material key and pawn key against a
+    full recompute (TreeEngine.debug) after every move of a fixed set of
+    random standard and chess960 games, every legal move is made and taken
+    back at each ply. A short search from every 10th position covers null
+    moves too.
+    """
+    engine = TreeEngine(1)
+    engine.debug = True
+    engine.max_depth = depth
+    rng = random.Random(1)
+    checked = 0
+    for game in range(2 * games):
+        if game < games:
+            board = chess.Board()
+        else:
+            board = chess.Board.from_chess960_pos(rng.randrange(960))
+        engine.new_game()
+        while not board.is_game_over() and board.ply() < max_plies:
+            engine.hash = zobrist.full_hash(board)
+            engine.score = evaluation.packed_score(board)
+            engine.material_key = material.material_key(board)
+            engine.pawn_hash = zobrist.pawn_hash(board)
+            for move in list(board.legal_moves):
+                engine.make_move(board, move)
+                engine.unmake_move(board)
+                checked += 1
+            if board.ply() % 10 == 0:
+                engine.iterative_deepening(board, None)
+            board.push(rng.choice(list(board.legal_moves)))
+    print(f"verify ok: {checked} make/unmake pairs over {2 * games} games")
+
+
+if __name__ == "__main__":
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    if "smp" in sys.argv[2:]:
+        run_smp(depth)
+    elif "eval" in sys.argv[2:]:
+        run_eval()
+    elif "verify" in sys.argv[2:]:
+        run_verify(depth=depth)
+    elif "elo" in sys.argv[2:]:
+        run_elo()
+    else:
+        run(depth)
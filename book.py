@@ -0,0 +1,41 @@
+# polyglot opening book, each book file is opened once per process and
+# shared by every engine and game in it
+import random
+import chess.polyglot
+
+_readers = {}
+
+
+def open_book(path):
+    """Memory mapped reader for the book at path, opened on first use"""
+    reader = _readers.get(path)
+    if reader is None:
+        reader = chess.polyglot.MemoryMappedReader(path)
+        _readers[path] = reader
+    return reader
+
+
+def book_move(board, path, mode="weighted", max_ply=20):
+    """
+    A book move for this position, or None if we're out of book
+    mode: "weighted" picks moves in proportion to their book weight,
+    "best" always plays the highest weighted one
+    max_ply: stop using the book after this many plies of the game
+    """
+    if board.ply() >= max_ply:
+        return None
+
+    reader = open_book(path)
+    try:
+        if mode == "best":
+            return reader.find(board).move
+        return reader.weighted_choice(board, random=random).move
+    except IndexError:
+        return None
+
+
+def close_books():
+    """Unmap every book opened so far"""
+    for reader in _readers.values():
+        reader.close()
+    _readers.clear()
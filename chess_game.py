@@ -5,9 +5,12 @@ from chessboard import ChessBoard
 import time
 from display import start_server
 from engines import SimpleEngine, StockfishEngine, HumanEngine, TreeEngine
+from smp import SMPTreeEngine
+from ponder import Ponderer
+from book import close_books
 
 class ChessGame:
-    def __init__(self, engine_white="stockfish", engine_black="stockfish"):
+    def __init__(self, engine_white="stockfish", engine_black="stockfish", ponder=False, book=None, tablebase=None):
         self.chessboard = ChessBoard()
         if engine_white == "stockfish":
             self.white_engine = StockfishEngine()
@@ -19,8 +22,11 @@ class ChessGame:
             self.white_engine = HumanEngine()
             self.white_engine_type = "human"
         elif engine_white == "tree":
-            self.white_engine = TreeEngine()
+            self.white_engine = TreeEngine(book=book, tablebase=tablebase)
             self.white_engine_type = "tree"
+        elif engine_white == "smp":
+            self.white_engine = SMPTreeEngine(book=book, tablebase=tablebase)
+            self.white_engine_type = "smp"
         else :
             raise ValueError("Invalid engine type for white")
         
@@ -34,21 +40,48 @@ class ChessGame:
             self.black_engine = HumanEngine()
             self.black_engine_type = "human"
         elif engine_black == "tree":    
-            self.black_engine = TreeEngine()
+            self.black_engine = TreeEngine(book=book, tablebase=tablebase)
             self.black_engine_type = "tree"
+        elif engine_black == "smp":
+            self.black_engine = SMPTreeEngine(book=book, tablebase=tablebase)
+            self.black_engine_type = "smp"
         else:
             raise ValueError("Invalid engine type for black")
+        
+        # tree engines can keep thinking on the opponent's time
+        self.ponderers = {chess.WHITE: None, chess.BLACK: None}
+        if ponder:
+            if self.white_engine_type in ("tree", "smp"):
+                self.ponderers[chess.WHITE] = Ponderer(self.white_engine)
+            if self.black_engine_type in ("tree", "smp"):
+                self.ponderers[chess.BLACK] = Ponderer(self.black_engine)
     
     def engine_move(self, think_time=0.01):
-        if self.chessboard.board.turn == chess.WHITE:
+        turn = self.chessboard.board.turn
+        ponderer = self.ponderers[turn]
+        if ponderer:
+            ponderer.stop(self.chessboard.board)
+
+        if turn == chess.WHITE:
             move = self.white_engine.select_move(self.chessboard.board, think_time)
         else:
             move = self.black_engine.select_move(self.chessboard.board, think_time)
 
         self.chessboard.make_move(move.uci())
 
+        if ponderer and not self.chessboard.board.is_game_over():
+            ponderer.start(self.chessboard.board)
+
         return move.uci()
     
+    def ponder_stats(self):
+        """Ponder hit rate of each side that ponders"""
+        stats = {}
+        for color, ponderer in self.ponderers.items():
+            if ponderer:
+                stats[chess.COLOR_NAMES[color]] = (ponderer.hits, ponderer.ponders, ponderer.hit_rate())
+        return stats
+    
     def update_display(self):
         self.chessboard.display("game.svg")
     
@@ -59,22 +92,28 @@ class ChessGame:
         return self.chessboard.get_result()
     
     def close(self):
-        if self.white_engine_type == "stockfish":
+        for ponderer in self.ponderers.values():
+            if ponderer:
+                ponderer.close()
+        if self.white_engine_type in ("stockfish", "smp"):
             self.white_engine.close()
-        if self.black_engine_type == "stockfish":
+        if self.black_engine_type in ("stockfish", "smp"):
             self.black_engine.close()
 
 if __name__ == "__main__":
-    player1 = input("Enter engine for white (stockfish/simple/human/tree): ")
-    player2 = input("Enter engine for black (stockfish/simple/human/tree): ")
+    player1 = input("Enter engine for white (stockfish/simple/human/tree/smp): ")
+    player2 = input("Enter engine for black (stockfish/simple/human/tree/smp): ")
 
     num_games = int(input("Enter number of games: "))
+    ponder = input("Ponder on the opponent's time? (y/n): ").strip().lower() == "y"
+    book = input("Polyglot opening book (blank for none): ").strip() or None
+    tablebase = input("Syzygy tablebase directory (blank for none): ").strip() or None
 
 
     server = start_server()
 
     for i in range(num_games):
-        game = ChessGame(player1, player2)
+        game = ChessGame(player1, player2, ponder, book, tablebase)
         game.update_display()
 
         try:
@@ -85,8 +124,11 @@ if __name__ == "__main__":
                 # time.sleep(0.1)
             
             print(f"\nGame Over! Result: {game.get_result()}")
+            for side, (hits, ponders, rate) in game.ponder_stats().items():
+                print(f"{side} ponder hits: {hits}/{ponders} ({rate:.0%})")
         
         finally:
             game.close()
         
+    close_books()
     server.server_close()
\ No newline at end of file
@@ -1,7 +1,20 @@
 # my own attempt at creating a chess engine, simple tree search only
 import chess
+import math
 import random
-import time
+import zobrist
+import evaluation
+import material
+from evaluation import PIECE_VALUES, MAX_PHASE, calculate_material, placement_score, taper
+from material import material_entry, SCALE_NORMAL
+from pawns import PawnTable
+from attacks import AttackMap
+from ordering import MoveOrdering, MAX_PLY
+from see import mvv_lva, captured_value, is_good_capture
+from timeman import TimeManager
+from book import book_move
+from tablebase import TablebaseProbe, tb_score
+from transposition import TranspositionTable, EXACT, LOWER, UPPER, MATE_SCORE, MATE_BOUND, INFINITY, score_to_tt, score_from_tt
 
 class StockfishEngine:
     def __init__(self):
@@ -35,14 +48,7 @@ class SimpleEngine:
     def __init__(self):
         self.name = "SimpleEngine"
 
-        self.piece_values = {
-            chess.PAWN: 100,
-            chess.KNIGHT: 300,
-            chess.BISHOP: 300,
-            chess.ROOK: 500,
-            chess.QUEEN: 900,
-            chess.KING: 0 
-        }
+        self.piece_values = PIECE_VALUES
     
     def get_moves(self, board):
         """Get list of legal moves from current position"""
@@ -52,84 +58,13 @@ class SimpleEngine:
         """
         Calculate material balance of position (positive is good for white)
         """
-        score = 0
-        
-        for piece_type in [chess.PAWN, chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN]:
-            white_pieces = len(board.pieces(piece_type, chess.WHITE))
-            black_pieces = len(board.pieces(piece_type, chess.BLACK))
-            score += (white_pieces - black_pieces) * self.piece_values[piece_type]
-        
-        return score
+        return calculate_material(board)
     
     def placement_score(self, board):
         """
         Calculate score based on piece positions.
         """
-        score = 0
-        
-        knight_table = [
-            [-50,-40,-30,-30,-30,-30,-40,-50],
-            [-40,-20,  0,  0,  0,  0,-20,-40],
-            [-30,  0, 10, 15, 15, 10,  0,-30],
-            [-30,  5, 15, 20, 20, 15,  5,-30],
-            [-30,  5, 15, 20, 20, 15,  5,-30],
-            [-30,  0, 10, 15, 15, 10,  0,-30],
-            [-40,-20,  0,  0,  0,  0,-20,-40],
-            [-50,-40,-30,-30,-30,-30,-40,-50]
-        ]
-        
-        bishop_table = [
-            [-20,-10,-10,-10,-10,-10,-10,-20],
-            [-10,  0,  0,  0,  0,  0,  0,-10],
-            [-10,  0,  5, 10, 10,  5,  0,-10],
-            [-10,  5,  5, 10, 10,  5,  5,-10],
-            [-10,  5,  5, 10, 10,  5,  5,-10],
-            [-10,  0,  5, 10, 10,  5,  0,-10],
-            [-10,  0,  0,  0,  0,  0,  0,-10],
-            [-20,-10,-10,-10,-10,-10,-10,-20]
-        ]
-        
-        king_table = [
-            [-30,-40,-40,-50,-50,-40,-40,-30],
-            [-30,-40,-40,-50,-50,-40,-40,-30],
-            [-30,-40,-40,-50,-50,-40,-40,-30],
-            [-30,-40,-40,-50,-50,-40,-40,-30],
-            [-20,-30,-30,-40,-40,-30,-30,-20],
-            [-10,-20,-20,-20,-20,-20,-20,-10],
-            [ 20, 20,  0,  0,  0,  0, 20, 20],
-            [ 20, 30, 10,  0,  0, 10, 30, 20]
-        ]
-        
-        pawn_advance = [0, 0, 5, 10, 20, 35, 60, 0]
-        
-        for square in chess.SQUARES:
-            piece = board.piece_at(square)
-            if piece is None:
-                continue
-
-            rank = chess.square_rank(square)
-            file = chess.square_file(square) 
-            
-            if piece.color == chess.BLACK:
-                rank = 7 - rank
-            
-            if piece.piece_type == chess.KNIGHT:
-                bonus = knight_table[7-rank][file]
-            elif piece.piece_type == chess.BISHOP:
-                bonus = bishop_table[7-rank][file]
-            elif piece.piece_type == chess.KING:
-                bonus = king_table[7-rank][file]
-            elif piece.piece_type == chess.PAWN:
-                bonus = pawn_advance[rank]
-            else:
-                bonus = 0
-            
-            if piece.color == chess.WHITE:
-                score += bonus
-            else:
-                score -= bonus
-        
-        return score
+        return placement_score(board)
     
     def evaluate_position(self, board):
         """
@@ -178,156 +113,685 @@ class SimpleEngine:
     
 
 class TreeEngine:
-    def __init__(self):
+    def __init__(self, hash_size_mb=16, tt=None, book=None, tablebase=None):
         self.name = "TreeEngine"
         self.max_depth = 20 
-        self.nodes_searched = 0 
         
-        self.piece_values = {
-            chess.PAWN: 100,
-            chess.KNIGHT: 300,
-            chess.BISHOP: 300,
-            chess.ROOK: 500,
-            chess.QUEEN: 900,
-            chess.KING: 0 
-        }
+        # polyglot opening book, skipped entirely when book is None
+        self.book = book
+        self.book_mode = "weighted"  # or "best"
+        self.book_max_ply = 20
+        self.book_moves = 0
+        
+        # syzygy tablebases, tablebase is the directory holding them
+        self.tablebase = TablebaseProbe(tablebase) if tablebase is not None else None
+        self.tb_hits = 0
+        self.root_decided = False
+        self.nodes_searched = 0 
+        self.qnodes_searched = 0  # quiescence nodes, counted separately
+        self.tt = tt if tt is not None else TranspositionTable(hash_size_mb)
+        self.time_manager = TimeManager()
+        self.ordering = MoveOrdering()
+        
+        # triangular PV table, pv_table[ply] holds the line from ply onwards
+        self.pv_table = [[None] * (MAX_PLY + 1) for _ in range(MAX_PLY + 1)]
+        self.pv_length = [0] * (MAX_PLY + 1)
+        self.pv = []
+        self.follow_pv = False
+        self.last_root_moves = None  # move stack of the last search's root
+        self.aspiration_window = 50
+        
+        self.null_move_min_depth = 3
+        self.null_move_verify_depth = 6
+        
+        # pruning margins near the leaves in centipawns, indexed by depth left
+        self.futility_margins = [0, PIECE_VALUES[chess.KNIGHT], PIECE_VALUES[chess.ROOK]]
+        self.reverse_futility_margin = PIECE_VALUES[chess.PAWN] * 3 // 2
+        self.delta_margin = PIECE_VALUES[chess.PAWN] * 2
+        self.lazy_margin = PIECE_VALUES[chess.PAWN] * 2
+        self.razor_margins = [0, PIECE_VALUES[chess.BISHOP], PIECE_VALUES[chess.ROOK] + PIECE_VALUES[chess.PAWN]]
+        
+        self.lmr_min_depth = 3
+        self.lmr_min_moves = 3
+        self.build_lmr_table()
+        self.iteration_stats = []  # (depth, nodes, quiescence nodes, seconds, branching factor)
+        
+        # best root move of the current iteration so far, so an unfinished
+        # iteration can still hand back a better move
+        self.root_best_move = None
+        self.root_best_score = None
+        self.partial_iterations = 0  # searches that ended on a partial result
+        
+        # move ordering stats, how often a cutoff came from the first move
+        self.beta_cutoffs = 0
+        self.first_move_cutoffs = 0
+        
+        # running zobrist key of the searched position, updated on make/unmake.
+        # hash_stack holds the keys of every earlier position back to the last
+        # irreversible game move, so it doubles as the repetition history
+        self.hash = 0
+        self.hash_stack = []
+        self.null_stack = []  # hash_stack lengths where a null move was made
+        # running material + placement score (white positive), same idea,
+        # midgame and endgame packed together (evaluation.pack)
+        self.score = 0
+        self.score_stack = []
+        # running material signature, see material.py
+        self.material_key = 0
+        self.material_stack = []
+        # running pawn-only key, and the pawn structure scores it indexes
+        self.pawn_hash = 0
+        self.pawn_hash_stack = []
+        self.pawn_table = PawnTable()
+        self.debug = False  # check incremental state against a full recompute
+        
+        self.piece_values = PIECE_VALUES
     
-    def quiescence(self, board, alpha, beta, start_time, time_limit, depth=0):
+    def build_lmr_table(self, base=0.75, divisor=2.25):
         """
-        Quiescence search - evaluates captures until a quiet position
+        Late move reduction in plies, lmr_table[depth][move_number]. Call
+        again with other numbers to tune it.
         """
-        self.nodes_searched += 1
+        self.lmr_table = [[0] * 64 for _ in range(64)]
+        for depth in range(1, 64):
+            for move_number in range(1, 64):
+                self.lmr_table[depth][move_number] = int(base + math.log(depth) * math.log(move_number) / divisor)
+    
+    def make_move(self, board, move):
+        """
+        Push a move during search, keeping the running hash and score up to date
+        """
+        self.hash_stack.append(self.hash)
+        self.score_stack.append(self.score)
+        self.material_stack.append(self.material_key)
+        self.pawn_hash_stack.append(self.pawn_hash)
+        key = self.hash ^ zobrist.move_delta(board, move)
+        self.score += evaluation.move_delta(board, move)
+        self.material_key += material.move_delta(board, move)
+        self.pawn_hash ^= zobrist.pawn_move_delta(board, move)
+        board.push(move)
+        self.hash = key ^ zobrist.castling_hash(board) ^ zobrist.ep_hash(board)
+        
+        if self.debug:
+            assert self.hash == zobrist.full_hash(board), f"hash mismatch after {move} in {board.fen()}"
+            assert self.score == evaluation.packed_score(board), \
+                f"score mismatch after {move} in {board.fen()}"
+            assert self.material_key == material.material_key(board), \
+                f"material key mismatch after {move} in {board.fen()}"
+            assert self.pawn_hash == zobrist.pawn_hash(board), f"pawn hash mismatch after {move} in {board.fen()}"
+    
+    def make_null_move(self, board):
+        """
+        Pass the move (null move pruning), undone with unmake_null_move
+        """
+        self.hash_stack.append(self.hash)
+        self.score_stack.append(self.score)
+        self.material_stack.append(self.material_key)
+        self.pawn_hash_stack.append(self.pawn_hash)
+        self.null_stack.append(len(self.hash_stack))
+        self.hash ^= zobrist.null_move_delta(board)
+        board.push(chess.Move.null())
+        
+        if self.debug:
+            assert self.hash == zobrist.full_hash(board), f"hash mismatch after null move in {board.fen()}"
+    
+    def unmake_move(self, board):
+        """
+        Pop the last move pushed with make_move
+        """
+        board.pop()
+        self.hash = self.hash_stack.pop()
+        self.score = self.score_stack.pop()
+        self.material_key = self.material_stack.pop()
+        self.pawn_hash = self.pawn_hash_stack.pop()
+    
+    def unmake_null_move(self, board):
+        self.null_stack.pop()
+        self.unmake_move(board)
+    
+    def static_eval(self, board, signature, attacks=None):
+        """
+        Leaf score from the side to move's point of view: the running score
+        blended by game phase plus the material table's and the pawn table's
+        terms, scaled down when the side ahead has too little left to win
+        signature: material_entry(self.material_key)
+        attacks: the node's AttackMap, adds mobility and king zone attacks
+        """
+        score = self.base_eval(board, signature)
+        if attacks is not None:
+            score += self.attack_terms(attacks, signature[1])
+        return self.scale_eval(board, signature, score)
+    
+    def base_eval(self, board, signature):
+        """White's score before the attack terms and the scaling"""
+        imbalance, phase, _, _, _ = signature
+        return taper(self.score, phase) + imbalance + self.pawn_table.score(board, self.pawn_hash)
+    
+    def attack_terms(self, attacks, phase):
+        """Mobility plus king zone attacks, the latter fading out towards the endgame"""
+        return attacks.mobility + attacks.king_danger * phase // MAX_PHASE
+    
+    def scale_eval(self, board, signature, score):
+        """Scale white's score by the material table and turn it to the side to move's view"""
+        _, _, white_scale, black_scale, _ = signature
+        if score > 0:
+            score = score * white_scale // SCALE_NORMAL
+        else:
+            score = score * black_scale // SCALE_NORMAL
+        return score if board.turn == chess.WHITE else -score
+    
+    def is_repetition(self, board, ply):
+        """
+        Has this position been seen before? Only looks back to the last
+        capture, pawn move or null move and only at positions with the same
+        side to move. Repeating a position from inside the search tree is
+        enough for a draw, one from before the root needs to have already
+        happened twice.
+        """
+        stack = self.hash_stack
+        end = min(board.halfmove_clock, len(stack))
+        if self.null_stack:
+            end = min(end, len(stack) - self.null_stack[-1])
+        
+        key = self.hash
+        seen_before = False
+        for distance in range(4, end + 1, 2):
+            if stack[-distance] == key:
+                if distance <= ply or seen_before:
+                    return True
+                seen_before = True
+        return False
+    
+    def game_history(self, board):
+        """
+        Keys of the game positions before this one, oldest first, back to
+        the last irreversible move
+        """
+        history = []
+        replay = board.copy()
+        for _ in range(min(board.halfmove_clock, len(board.move_stack))):
+            replay.pop()
+            history.append(zobrist.full_hash(replay))
+        history.reverse()
+        return history
+    
+    def quiescence(self, board, alpha, beta, depth=0, ply=0):
+        """
+        Quiescence search - evaluates captures (and queen promotions) until a
+        quiet position (negamax, score is from the side to move's point of view)
+        """
+        self.qnodes_searched += 1
         
-        if time.time() - start_time > time_limit * 0.95:
+        if not self.qnodes_searched & self.time_manager.check_mask and self.time_manager.out_of_time():
             return None
         
-        stand_pat = self.evaluate_position(board)
+        key = self.hash
+        entry = self.tt.probe(key)
+        if entry is not None:
+            _, tt_bound, tt_score, _ = entry
+            tt_score = score_from_tt(tt_score, ply)
+            if (tt_bound == EXACT
+                    or (tt_bound == LOWER and tt_score >= beta)
+                    or (tt_bound == UPPER and tt_score <= alpha)):
+                return tt_score
+        
+        signature = material_entry(self.material_key)
+        if signature[4]:
+            return 0
+        
+        # lazy eval: far enough above beta that the attack terms can't
+        # change anything, skip building the attack map
+        score = self.base_eval(board, signature)
+        stand_pat = self.scale_eval(board, signature, score)
+        if stand_pat - self.lazy_margin >= beta and not board.is_check():
+            return stand_pat
+        attacks = AttackMap(board)
+        stand_pat = self.scale_eval(board, signature, score + self.attack_terms(attacks, signature[1]))
         
         if depth > 10:
             return stand_pat
-            
-        if board.turn == chess.WHITE:
-            alpha = max(alpha, stand_pat)
-        else:
-            beta = min(beta, stand_pat)
-            
+        
+        if board.is_check():
+            return self.quiescence_evasions(board, alpha, beta, depth, ply)
+        
+        alpha_orig = alpha
+        best_score = stand_pat
+        best_move = None
+        if stand_pat > alpha:
+            alpha = stand_pat
         if alpha >= beta:
             return stand_pat
             
-        for move in board.legal_moves:
-            if not board.is_capture(move):
+        # delta pruning: even taking a queen wouldn't get us back to alpha
+        if stand_pat + PIECE_VALUES[chess.QUEEN] + self.delta_margin < alpha:
+            return stand_pat
+        
+        # only captures get generated, plus pushes to the last rank
+        us = board.turn
+        promotion_rank = chess.BB_RANK_8 if us == chess.WHITE else chess.BB_RANK_1
+        seventh_rank = chess.BB_RANK_7 if us == chess.WHITE else chess.BB_RANK_2
+        moves = list(board.generate_legal_captures())
+        if board.pawns & board.occupied_co[us] & seventh_rank:
+            moves.extend(board.generate_legal_moves(board.pawns & seventh_rank, promotion_rank & ~board.occupied))
+        
+        # winning and even captures only, best victim first
+        captures = []
+        for move in moves:
+            if move.promotion:
+                # only ever promote to a queen in here
+                if move.promotion != chess.QUEEN:
+                    continue
+            elif (stand_pat + captured_value(board, move) + self.delta_margin < alpha
+                    or not is_good_capture(board, move, attacks)):
                 continue
-                
-            board.push(move)
-            score = self.quiescence(board, alpha, beta, start_time, time_limit, depth + 1)
-            board.pop()
+            captures.append(move)
+        captures.sort(key=lambda move: mvv_lva(board, move), reverse=True)
+        
+        for move in captures:
+            self.make_move(board, move)
+            score = self.quiescence(board, -beta, -alpha, depth + 1, ply + 1)
+            self.unmake_move(board)
             
             if score is None: 
                 return None
-                
-            if board.turn == chess.WHITE:
-                alpha = max(alpha, score)
-            else:
-                beta = min(beta, score)
-                
+            score = -score
+            
+            if score > best_score:
+                best_score = score
+                best_move = move
+            if score > alpha:
+                alpha = score
             if alpha >= beta:
                 break
-                
-        return alpha if board.turn == chess.WHITE else beta
+        
+        if best_score >= beta:
+            bound = LOWER
+        elif best_score > alpha_orig:
+            bound = EXACT
+        else:
+            bound = UPPER
+        self.tt.store(key, 0, bound, score_to_tt(best_score, ply), best_move)
+        
+        return best_score
 
-    def alpha_beta(self, board, depth, alpha, beta, maximizing_player, start_time, time_limit):
+    def quiescence_evasions(self, board, alpha, beta, depth, ply):
+        """
+        Quiescence node in check: standing pat isn't an option, every
+        evasion gets looked at and having none is mate
+        """
+        best_score = -MATE_SCORE + ply
+        evasions = list(board.legal_moves)
+        evasions.sort(key=lambda move: mvv_lva(board, move) if board.is_capture(move) else -1000, reverse=True)
+        
+        for move in evasions:
+            self.make_move(board, move)
+            score = self.quiescence(board, -beta, -alpha, depth + 1, ply + 1)
+            self.unmake_move(board)
+            
+            if score is None:
+                return None
+            score = -score
+            
+            if score > best_score:
+                best_score = score
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                break
+        
+        return best_score
+    
+    def alpha_beta(self, board, depth, alpha, beta, ply=0, allow_null=True):
         """
-        Alpha-beta pruning search
+        Principal variation search (negamax, score is from the side to move's
+        point of view). The first move gets the full window, the rest are
+        only checked against alpha with a null window and re-searched if
+        they turn out better.
         """
         self.nodes_searched += 1
+        self.pv_length[ply] = ply
         
-        if time.time() - start_time > time_limit * 0.95:
+        if not self.nodes_searched & self.time_manager.check_mask and self.time_manager.out_of_time():
             return None, None
             
-        if board.is_game_over():
-            if board.is_checkmate():
-                return (-10000 if board.turn else 10000), None
-            return 0, None  # Draw
+        # draws we can see without generating moves, mate and stalemate show
+        # up below when the move loop finds nothing to play
+        signature = material_entry(self.material_key)
+        if ply > 0 and (signature[4] or self.is_repetition(board, ply)):
+            return 0, None
+        # fifty move rule, but a mate on the 100th half-move still counts.
+        # Out of check it can't be mate, in check look for any legal move.
+        if (ply > 0 and board.halfmove_clock >= 100
+                and (not board.is_check() or any(board.generate_legal_moves()))):
+            return 0, None
         
         # start with captures 
         if depth <= 0:
-            score = self.quiescence(board, alpha, beta, start_time, time_limit)
+            score = self.quiescence(board, alpha, beta, ply=ply)
             if score is None:  # Out of time
                 return None, None
             return score, None
         
-        legal_moves = list(board.legal_moves)
+        pv_node = beta - alpha > 1
+        key = self.hash
+        hash_move = None
+        entry = self.tt.probe(key)
+        if entry is not None:
+            tt_depth, tt_bound, tt_score, hash_move = entry
+            # only cut off in null window nodes so the PV stays intact
+            if tt_depth >= depth and not pv_node:
+                tt_score = score_from_tt(tt_score, ply)
+                if (tt_bound == EXACT
+                        or (tt_bound == LOWER and tt_score >= beta)
+                        or (tt_bound == UPPER and tt_score <= alpha)):
+                    return tt_score, hash_move
+        
+        # solved endgame, the tablebase result ends the subtree. If it doesn't
+        # fit the window we still search, but the result has to agree with it.
+        tb_floor = -INFINITY
+        tb_ceiling = INFINITY
+        if ply > 0 and self.tablebase is not None and self.tablebase.can_probe(board):
+            wdl = self.tablebase.probe_wdl(board, key)
+            if wdl is not None:
+                self.tb_hits += 1
+                tb_eval, tb_bound = tb_score(wdl, ply)
+                if (tb_bound == EXACT
+                        or (tb_bound == LOWER and tb_eval >= beta)
+                        or (tb_bound == UPPER and tb_eval <= alpha)):
+                    self.tt.store(key, min(depth + 6, MAX_PLY), tb_bound, score_to_tt(tb_eval, ply), None)
+                    return tb_eval, None
+                if tb_bound == LOWER:
+                    tb_floor = tb_eval
+                else:
+                    tb_ceiling = tb_eval
+        
+        in_check = board.is_check()
+        attacks = AttackMap(board)
+        static_eval = self.static_eval(board, signature, attacks)
+        near_leaves = not pv_node and not in_check and depth <= 2 and abs(beta) < MATE_BOUND
+        
+        # reverse futility: so far above beta that losing a margin per ply
+        # of depth left still fails high
+        if near_leaves and static_eval - self.reverse_futility_margin * depth >= beta:
+            return static_eval - self.reverse_futility_margin * depth, None
+        
+        # razoring: so far below alpha that only captures could help, let
+        # quiescence decide
+        if near_leaves and static_eval + self.razor_margins[depth] <= alpha:
+            razor_alpha = alpha - self.razor_margins[depth] if depth > 1 else alpha
+            score = self.quiescence(board, razor_alpha, razor_alpha + 1, ply=ply)
+            if score is None:
+                return None, None
+            if depth == 1 or score <= razor_alpha:
+                return score, None
+        
+        # frontier futility: quiet moves that can't get eval back up to alpha
+        # aren't worth searching
+        futile = near_leaves and static_eval + self.futility_margins[depth] <= alpha
+        
+        # null move pruning: if passing still fails high the position is so
+        # good a real move will too. Not when in check, on the PV or with only
+        # pawns left, where passing could be better than any move (zugzwang).
+        if (allow_null and not pv_node and not in_check and depth >= self.null_move_min_depth
+                and board.occupied_co[board.turn] & ~(board.pawns | board.kings)):
+            if static_eval >= beta:
+                reduction = 2 + depth // 4 + min((static_eval - beta) // 200, 2)
+                self.make_null_move(board)
+                null_score, _ = self.alpha_beta(board, depth - 1 - reduction, -beta, -beta + 1, ply + 1, False)
+                self.unmake_null_move(board)
+                if null_score is None:
+                    return None, None
+                null_score = -null_score
+                
+                if null_score >= beta:
+                    if null_score >= MATE_BOUND:
+                        null_score = beta  # don't trust mates found by passing
+                    if depth < self.null_move_verify_depth:
+                        return null_score, None
+                    # deep enough that a zugzwang would hurt, check it with a
+                    # reduced search that isn't allowed to pass
+                    verify_score, _ = self.alpha_beta(board, depth - reduction, beta - 1, beta, ply, False)
+                    if verify_score is None:
+                        return None, None
+                    if verify_score >= beta:
+                        return null_score, None
+        
+        # walk down the previous iteration's PV first
+        pv_move = None
+        if self.follow_pv:
+            if ply < len(self.pv):
+                pv_move = self.pv[ply]
+                hash_move = pv_move
+            else:
+                self.follow_pv = False
         
-        legal_moves.sort(key=lambda move: board.is_capture(move), reverse=True)
+        alpha_orig = alpha
+        best_move = None
+        max_eval = -INFINITY
+        for move_number, move in enumerate(self.ordering.staged_moves(board, hash_move, ply, attacks)):
+            self.follow_pv = self.follow_pv and move == pv_move
+            quiet = not board.is_capture(move) and not move.promotion
+            late = (quiet and move_number >= self.lmr_min_moves and depth >= self.lmr_min_depth
+                    and not in_check and not self.ordering.is_killer(move, ply))
+            
+            if futile and quiet and move_number > 0 and not board.gives_check(move):
+                if static_eval + self.futility_margins[depth] > max_eval:
+                    max_eval = static_eval + self.futility_margins[depth]
+                continue
+            
+            self.make_move(board, move)
+            if move_number == 0:
+                eval, _ = self.alpha_beta(board, depth - 1, -beta, -alpha, ply + 1)
+            else:
+                # late move reductions: quiet moves this far down the list
+                # rarely matter, look at them shallower first
+                reduction = 0
+                if late and not board.is_check():
+                    reduction = self.lmr_table[min(depth, 63)][min(move_number, 63)]
+                    if pv_node:
+                        reduction -= 1
+                    reduction = max(0, min(reduction, depth - 2))
+                
+                eval, _ = self.alpha_beta(board, depth - 1 - reduction, -alpha - 1, -alpha, ply + 1)
+                if eval is not None and reduction and -eval > alpha:
+                    eval, _ = self.alpha_beta(board, depth - 1, -alpha - 1, -alpha, ply + 1)
+                if eval is not None and alpha < -eval < beta:
+                    eval, _ = self.alpha_beta(board, depth - 1, -beta, -alpha, ply + 1)
+            self.unmake_move(board)
+            
+            if eval is None:  # Out of time
+                return None, None
+            eval = -eval
+            
+            if eval > max_eval:
+                max_eval = eval
+                best_move = move
+            if eval > alpha:
+                alpha = eval
+                self.update_pv(move, ply)
+                if ply == 0:
+                    # proven better than everything searched before it at
+                    # this depth, worth playing even if the iteration dies
+                    self.root_best_move = move
+                    self.root_best_score = eval
+            if beta <= alpha:
+                if quiet:
+                    self.ordering.update(board, move, depth, ply)
+                self.beta_cutoffs += 1
+                if move_number == 0:
+                    self.first_move_cutoffs += 1
+                break  
+        
+        if best_move is None:
+            # no legal moves
+            return (-MATE_SCORE + ply if in_check else 0), None
+        
+        max_eval = min(max(max_eval, tb_floor), tb_ceiling)
+        if max_eval >= beta:
+            bound = LOWER
+        elif max_eval > alpha_orig:
+            bound = EXACT
+        else:
+            bound = UPPER
+        self.tt.store(key, depth, bound, score_to_tt(max_eval, ply), best_move)
         
-        best_move = legal_moves[0]
+        return max_eval, best_move
+    
+    def update_pv(self, move, ply):
+        """
+        Triangular PV table, the line at ply is this move followed by the
+        line the child just found
+        """
+        row = self.pv_table[ply]
+        child = self.pv_table[ply + 1]
+        row[ply] = move
+        child_length = self.pv_length[ply + 1]
+        for i in range(ply + 1, child_length):
+            row[i] = child[i]
+        self.pv_length[ply] = max(child_length, ply + 1)
+    
+    def search_root(self, board, depth, previous_score):
+        """
+        Search the root with an aspiration window around the previous
+        iteration's score, widening it whenever the result falls outside
+        """
+        self.follow_pv = True
+        if previous_score is None or depth < 3 or abs(previous_score) >= MATE_BOUND:
+            return self.alpha_beta(board, depth, -INFINITY, INFINITY)
+        
+        window = self.aspiration_window
+        alpha = max(previous_score - window, -INFINITY)
+        beta = min(previous_score + window, INFINITY)
+        while True:
+            eval, move = self.alpha_beta(board, depth, alpha, beta)
+            if eval is None:
+                return None, None
+            
+            if eval <= alpha and alpha > -INFINITY:
+                alpha = max(alpha - window, -INFINITY)  # fail low
+            elif eval >= beta and beta < INFINITY:
+                beta = min(beta + window, INFINITY)  # fail high
+            else:
+                return eval, move
+            window *= 2
+            self.follow_pv = True
+    
+    def new_game(self):
+        """
+        Forget everything learned in the last game
+        """
+        self.tt.clear()
+        self.ordering.clear()
+        self.pawn_table.clear()
+        self.pv = []
+        self.last_root_moves = None
+    
+    def start_search(self, board):
+        """
+        Carry the tables over from the last search. If this position follows
+        on from the last root in the same game, the killers move up by the
+        plies played and whatever is left of the old PV is tried first.
+        """
+        self.tt.new_search()
         
-        if maximizing_player:
-            max_eval = float('-inf')
-            for move in legal_moves:
-                board.push(move)
-                eval, _ = self.alpha_beta(board, depth - 1, alpha, beta, False, start_time, time_limit)
-                board.pop()
-                
-                if eval is None:  # Out of time
-                    return None, None
-                
-                if eval > max_eval:
-                    max_eval = eval
-                    best_move = move
-                alpha = max(alpha, eval)
-                if beta <= alpha:
-                    break  
-            return max_eval, best_move
+        moves = board.move_stack
+        last = self.last_root_moves
+        plies_played = -1
+        if last is not None and len(moves) >= len(last) and moves[:len(last)] == last:
+            plies_played = len(moves) - len(last)
+        self.ordering.new_search(plies_played)
+        
+        if 0 < plies_played < len(self.pv) and self.pv[:plies_played] == moves[len(last):]:
+            self.pv = self.pv[plies_played:]
         else:
-            min_eval = float('inf')
-            for move in legal_moves:
-                board.push(move)
-                eval, _ = self.alpha_beta(board, depth - 1, alpha, beta, True, start_time, time_limit)
-                board.pop()
-                
-                if eval is None:  # Out of time
-                    return None, None
-                
-                if eval < min_eval:
-                    min_eval = eval
-                    best_move = move
-                beta = min(beta, eval)
-                if beta <= alpha:
-                    break  
-            return min_eval, best_move
+            self.pv = []
+        self.last_root_moves = list(moves)
     
-    def iterative_deepening(self, board, time_limit):
+    def iterative_deepening(self, board, time_limit, start_depth=1):
         """
         Keep going with more time left
+        time_limit: seconds, or None to just search to max_depth
+        start_depth: first depth to search, helpers in smp.py skip ahead
         """
-        start_time = time.time()
+        self.time_manager.start(time_limit)
         best_move = None
         best_eval = None
-        depth = 1
+        score = None
+        stable_iterations = 0
+        depth = start_depth
+        self.start_search(board)
+        self.beta_cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.iteration_stats = []
+        self.hash = zobrist.full_hash(board)
+        self.hash_stack = self.game_history(board)
+        self.null_stack = []
+        self.score = evaluation.packed_score(board)
+        self.score_stack = []
+        self.material_key = material.material_key(board)
+        self.material_stack = []
+        self.pawn_hash = zobrist.pawn_hash(board)
+        self.pawn_hash_stack = []
+        self.tb_hits = 0
+        # set when the move comes from somewhere better than a search, smp.py
+        # won't let a helper's search overrule it
+        self.root_decided = True
+        
+        # nothing to think about
+        legal_moves = list(board.legal_moves)
+        if len(legal_moves) == 1:
+            return legal_moves[0], taper(self.score, evaluation.game_phase(board))
+        
+        # solved endgame, play the tablebase move instead of searching
+        if self.tablebase is not None:
+            result = self.tablebase.root_move(board)
+            if result is not None:
+                move, wdl = result
+                self.tb_hits += 1
+                self.pv = [move]
+                score = tb_score(wdl, 0)[0]
+                return move, score if board.turn == chess.WHITE else -score
+        self.root_decided = False
         
         while depth <= self.max_depth:
-            self.nodes_searched = 0  # Reset counter for this depth
+            self.nodes_searched = 0  # Reset counters for this depth
+            self.qnodes_searched = 0
             
-            if time.time() - start_time > time_limit * 0.8: 
+            # don't start an iteration we probably can't finish
+            if depth > start_depth and not self.time_manager.start_iteration(stable_iterations):
                 break
                 
-            # Run alpha-beta search at current depth
-            eval, move = self.alpha_beta(
-                board, 
-                depth,
-                float('-inf'),
-                float('inf'),
-                board.turn == chess.WHITE,
-                start_time,
-                time_limit
-            )
+            if depth > start_depth:
+                self.ordering.age()
             
-            # stop if no time
+            # Run the search at current depth, the previous PV is tried first
+            # and the table keeps the best moves from everywhere else
+            self.root_best_move = None
+            self.root_best_score = None
+            eval, move = self.search_root(board, depth, score)
+            
+            # stop if no time, but keep a move the unfinished iteration found
             if eval is None:
+                if self.root_best_move is not None:
+                    self.partial_iterations += 1
+                    best_move = self.root_best_move
+                    best_eval = self.root_best_score if board.turn == chess.WHITE else -self.root_best_score
                 break
-                
-            best_eval = eval
+            
+            score = eval
+            self.pv = self.pv_table[0][:self.pv_length[0]]
+            
+            # effective branching factor, how many times more nodes this
+            # iteration took than the last one
+            previous_nodes = self.iteration_stats[-1][1] if self.iteration_stats else 0
+            branching = self.nodes_searched / previous_nodes if previous_nodes else 0.0
+            self.iteration_stats.append((depth, self.nodes_searched, self.qnodes_searched,
+                                         self.time_manager.elapsed(), branching))
+            
+            stable_iterations = stable_iterations + 1 if move == best_move else 0
+            
+            # back to white's point of view
+            best_eval = eval if board.turn == chess.WHITE else -eval
             best_move = move
             
             depth += 1
@@ -339,15 +803,30 @@ class TreeEngine:
         Select best move using iterative deepening with alpha-beta search
         think_time: time limit in seconds
         """
+        if self.book is not None:
+            move = book_move(board, self.book, self.book_mode, self.book_max_ply)
+            if move is not None:
+                self.book_moves += 1
+                return move
+        
         best_move, eval = self.iterative_deepening(board, think_time)
         
         if best_move:
             print(f"\nFinal evaluation: {eval/100:+.2f} pawns")
+            if self.tb_hits:
+                print(f"Tablebase hits: {self.tb_hits}")
             return best_move
         else:
             # gg
             return list(board.legal_moves)[0]
     
+    def stop(self):
+        """
+        Stop the search running in another thread, select_move then returns
+        the best move found so far
+        """
+        self.time_manager.stop()
+    
     def get_name(self):
         return self.name
     
@@ -359,84 +838,13 @@ class TreeEngine:
         """
         Calculate material balance of position (positive is good for white)
         """
-        score = 0
-        
-        for piece_type in [chess.PAWN, chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN]:
-            white_pieces = len(board.pieces(piece_type, chess.WHITE))
-            black_pieces = len(board.pieces(piece_type, chess.BLACK))
-            score += (white_pieces - black_pieces) * self.piece_values[piece_type]
-        
-        return score
+        return calculate_material(board)
     
     def placement_score(self, board):
         """
         Calculate score based on piece positions.
         """
-        score = 0
-        
-        knight_table = [
-            [-50,-40,-30,-30,-30,-30,-40,-50],
-            [-40,-20,  0,  0,  0,  0,-20,-40],
-            [-30,  0, 10, 15, 15, 10,  0,-30],
-            [-30,  5, 15, 20, 20, 15,  5,-30],
-            [-30,  5, 15, 20, 20, 15,  5,-30],
-            [-30,  0, 10, 15, 15, 10,  0,-30],
-            [-40,-20,  0,  0,  0,  0,-20,-40],
-            [-50,-40,-30,-30,-30,-30,-40,-50]
-        ]
-        
-        bishop_table = [
-            [-20,-10,-10,-10,-10,-10,-10,-20],
-            [-10,  0,  0,  0,  0,  0,  0,-10],
-            [-10,  0,  5, 10, 10,  5,  0,-10],
-            [-10,  5,  5, 10, 10,  5,  5,-10],
-            [-10,  5,  5, 10, 10,  5,  5,-10],
-            [-10,  0,  5, 10, 10,  5,  0,-10],
-            [-10,  0,  0,  0,  0,  0,  0,-10],
-            [-20,-10,-10,-10,-10,-10,-10,-20]
-        ]
-        
-        king_table = [
-            [-30,-40,-40,-50,-50,-40,-40,-30],
-            [-30,-40,-40,-50,-50,-40,-40,-30],
-            [-30,-40,-40,-50,-50,-40,-40,-30],
-            [-30,-40,-40,-50,-50,-40,-40,-30],
-            [-20,-30,-30,-40,-40,-30,-30,-20],
-            [-10,-20,-20,-20,-20,-20,-20,-10],
-            [ 20, 20,  0,  0,  0,  0, 20, 20],
-            [ 20, 30, 10,  0,  0, 10, 30, 20]
-        ]
-        
-        pawn_advance = [0, 0, 5, 10, 20, 35, 60, 0]
-        
-        for square in chess.SQUARES:
-            piece = board.piece_at(square)
-            if piece is None:
-                continue
-
-            rank = chess.square_rank(square)
-            file = chess.square_file(square) 
-            
-            if piece.color == chess.BLACK:
-                rank = 7 - rank
-            
-            if piece.piece_type == chess.KNIGHT:
-                bonus = knight_table[7-rank][file]
-            elif piece.piece_type == chess.BISHOP:
-                bonus = bishop_table[7-rank][file]
-            elif piece.piece_type == chess.KING:
-                bonus = king_table[7-rank][file]
-            elif piece.piece_type == chess.PAWN:
-                bonus = pawn_advance[rank]
-            else:
-                bonus = 0
-            
-            if piece.color == chess.WHITE:
-                score += bonus
-            else:
-                score -= bonus
-        
-        return score
+        return placement_score(board)
     
     def evaluate_position(self, board):
         """
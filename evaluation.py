@@ -0,0 +1,212 @@
+# evaluation kernel shared by the engines, all the tables are built once at import
+import chess
+from zobrist import castling_squares
+
+PIECE_VALUES = {
+    chess.PAWN: 100,
+    chess.KNIGHT: 300,
+    chess.BISHOP: 300,
+    chess.ROOK: 500,
+    chess.QUEEN: 900,
+    chess.KING: 0
+}
+
+# tables as you'd look at the board from white's side, rank 8 first
+knight_table = [
+    [-50,-40,-30,-30,-30,-30,-40,-50],
+    [-40,-20,  0,  0,  0,  0,-20,-40],
+    [-30,  0, 10, 15, 15, 10,  0,-30],
+    [-30,  5, 15, 20, 20, 15,  5,-30],
+    [-30,  5, 15, 20, 20, 15,  5,-30],
+    [-30,  0, 10, 15, 15, 10,  0,-30],
+    [-40,-20,  0,  0,  0,  0,-20,-40],
+    [-50,-40,-30,-30,-30,-30,-40,-50]
+]
+
+bishop_table = [
+    [-20,-10,-10,-10,-10,-10,-10,-20],
+    [-10,  0,  0,  0,  0,  0,  0,-10],
+    [-10,  0,  5, 10, 10,  5,  0,-10],
+    [-10,  5,  5, 10, 10,  5,  5,-10],
+    [-10,  5,  5, 10, 10,  5,  5,-10],
+    [-10,  0,  5, 10, 10,  5,  0,-10],
+    [-10,  0,  0,  0,  0,  0,  0,-10],
+    [-20,-10,-10,-10,-10,-10,-10,-20]
+]
+
+king_table = [
+    [-30,-40,-40,-50,-50,-40,-40,-30],
+    [-30,-40,-40,-50,-50,-40,-40,-30],
+    [-30,-40,-40,-50,-50,-40,-40,-30],
+    [-30,-40,-40,-50,-50,-40,-40,-30],
+    [-20,-30,-30,-40,-40,-30,-30,-20],
+    [-10,-20,-20,-20,-20,-20,-20,-10],
+    [ 20, 20,  0,  0,  0,  0, 20, 20],
+    [ 20, 30, 10,  0,  0, 10, 30, 20]
+]
+
+pawn_advance = [0, 0, 5, 10, 20, 35, 60, 0]
+
+# endgame versions, the king should come out and fight and pawns
+# close to queening are worth a lot more
+king_endgame_table = [
+    [-50,-40,-30,-20,-20,-30,-40,-50],
+    [-30,-20,-10,  0,  0,-10,-20,-30],
+    [-30,-10, 20, 30, 30, 20,-10,-30],
+    [-30,-10, 30, 40, 40, 30,-10,-30],
+    [-30,-10, 30, 40, 40, 30,-10,-30],
+    [-30,-10, 20, 30, 30, 20,-10,-30],
+    [-30,-30,  0,  0,  0,  0,-30,-30],
+    [-50,-30,-30,-30,-30,-30,-30,-50]
+]
+
+pawn_advance_endgame = [0, 0, 10, 20, 30, 50, 80, 0]
+
+# game phase from the pieces left, MAX_PHASE with everything on the board
+# and 0 with only kings and pawns
+PHASE_WEIGHTS = {chess.KNIGHT: 1, chess.BISHOP: 1, chess.ROOK: 2, chess.QUEEN: 4}
+MAX_PHASE = 24
+
+# midgame and endgame scores travel packed in one int, so the search still
+# only adds one number per piece that moves
+EG_SHIFT = 20
+MG_HALF = 1 << (EG_SHIFT - 1)
+MG_MASK = (1 << EG_SHIFT) - 1
+
+
+def pack(mg, eg):
+    return (eg << EG_SHIFT) + mg
+
+
+def unpack(score):
+    """(mg, eg) of a packed score"""
+    mg = ((score + MG_HALF) & MG_MASK) - MG_HALF
+    return mg, (score - mg) >> EG_SHIFT
+
+
+def taper(score, phase):
+    """Blend a packed score by game phase, MAX_PHASE is pure midgame"""
+    mg, eg = unpack(score)
+    return (mg * phase + eg * (MAX_PHASE - phase)) // MAX_PHASE
+
+
+def _flat_table(piece_type, color, endgame=False):
+    """
+    64 entry table indexed by square, black's entries are negated so the
+    kernel can just add everything up
+    """
+    table = []
+    for square in chess.SQUARES:
+        rank = chess.square_rank(square)
+        file = chess.square_file(square)
+        if color == chess.BLACK:
+            rank = 7 - rank
+
+        if piece_type == chess.KNIGHT:
+            bonus = knight_table[7-rank][file]
+        elif piece_type == chess.BISHOP:
+            bonus = bishop_table[7-rank][file]
+        elif piece_type == chess.KING:
+            bonus = (king_endgame_table if endgame else king_table)[7-rank][file]
+        elif piece_type == chess.PAWN:
+            bonus = (pawn_advance_endgame if endgame else pawn_advance)[rank]
+        else:
+            bonus = 0
+
+        table.append(bonus if color == chess.WHITE else -bonus)
+    return table
+
+
+# PST_MG/PST_EG[color][piece_type][square], white positive and black negative
+PST_MG = [[None] + [_flat_table(piece_type, color) for piece_type in chess.PIECE_TYPES]
+          for color in (chess.BLACK, chess.WHITE)]
+PST_EG = [[None] + [_flat_table(piece_type, color, True) for piece_type in chess.PIECE_TYPES]
+          for color in (chess.BLACK, chess.WHITE)]
+
+
+def game_phase(board):
+    """Phase of the position from its pieces, see PHASE_WEIGHTS"""
+    phase = (board.knights.bit_count() + board.bishops.bit_count()
+             + 2 * board.rooks.bit_count() + 4 * board.queens.bit_count())
+    return min(phase, MAX_PHASE)
+
+
+def calculate_material(board):
+    """
+    Material balance of the position (positive is good for white)
+    """
+    white = board.occupied_co[chess.WHITE]
+    black = board.occupied_co[chess.BLACK]
+    score = 0
+    for piece_type, mask in ((chess.PAWN, board.pawns), (chess.KNIGHT, board.knights),
+                             (chess.BISHOP, board.bishops), (chess.ROOK, board.rooks),
+                             (chess.QUEEN, board.queens)):
+        score += ((mask & white).bit_count() - (mask & black).bit_count()) * PIECE_VALUES[piece_type]
+    return score
+
+
+# PIECE_SQUARE[color][piece_type][square] = signed material + placement
+# packed for both phases, what a piece standing on that square adds to the
+# white-positive score
+PIECE_SQUARE = [[None] + [[pack(PST_MG[color][piece_type][square], PST_EG[color][piece_type][square])
+                           + (1 if color == chess.WHITE else -1) * pack(PIECE_VALUES[piece_type], PIECE_VALUES[piece_type])
+                           for square in chess.SQUARES]
+                          for piece_type in chess.PIECE_TYPES]
+                for color in (chess.BLACK, chess.WHITE)]
+
+
+def packed_score(board):
+    """
+    Packed material + placement score of the position, only visits occupied
+    squares of the piece types that have a table or a value
+    """
+    score = 0
+    for color in (chess.WHITE, chess.BLACK):
+        tables = PIECE_SQUARE[color]
+        occupied = board.occupied_co[color]
+        for piece_type, mask in ((chess.PAWN, board.pawns), (chess.KNIGHT, board.knights),
+                                 (chess.BISHOP, board.bishops), (chess.ROOK, board.rooks),
+                                 (chess.QUEEN, board.queens), (chess.KING, board.kings)):
+            table = tables[piece_type]
+            bb = mask & occupied
+            while bb:
+                square = (bb & -bb).bit_length() - 1
+                score += table[square]
+                bb &= bb - 1
+    return score
+
+
+def placement_score(board):
+    """
+    Piece-square score of the position (positive is good for white), the
+    midgame and endgame tables blended by game phase
+    """
+    return taper(packed_score(board), game_phase(board)) - calculate_material(board)
+
+
+def move_delta(board, move):
+    """
+    Change in packed_score caused by `move`, call before board.push(move)
+    """
+    us = board.turn
+    from_square = move.from_square
+    to_square = move.to_square
+    piece_type = board.piece_type_at(from_square)
+    tables = PIECE_SQUARE[us]
+
+    if piece_type == chess.KING and board.is_castling(move):
+        king_to, rook_from, rook_to = castling_squares(board, move)
+        return (tables[chess.KING][king_to] - tables[chess.KING][from_square]
+                + tables[chess.ROOK][rook_to] - tables[chess.ROOK][rook_from])
+
+    delta = tables[move.promotion or piece_type][to_square] - tables[piece_type][from_square]
+
+    captured_type = board.piece_type_at(to_square)
+    if captured_type:
+        delta -= PIECE_SQUARE[not us][captured_type][to_square]
+    elif piece_type == chess.PAWN and to_square == board.ep_square:
+        captured_square = to_square - 8 if us == chess.WHITE else to_square + 8
+        delta -= PIECE_SQUARE[not us][chess.PAWN][captured_square]
+
+    return delta
+
@@ -0,0 +1,107 @@
+# material signature table: everything that only depends on how many of
+# each piece are on the board, worked out once per signature and cached
+import chess
+from evaluation import PIECE_VALUES, PHASE_WEIGHTS, MAX_PHASE
+
+# four bits per piece count, MATERIAL_SHIFT[color][piece_type]
+MATERIAL_SHIFT = [[None] + [4 * (color * 5 + piece_type - 1) for piece_type in chess.PIECE_TYPES[:5]] + [None]
+                  for color in (chess.BLACK, chess.WHITE)]
+COUNT_MASK = 15
+
+# scale factors are out of SCALE_NORMAL, 0 means the side can't win
+SCALE_NORMAL = 64
+BISHOP_PAIR = 30
+
+_table = {}
+
+
+def material_key(board):
+    """Signature of the position from scratch, only needed at the root"""
+    key = 0
+    for color in chess.COLORS:
+        occupied = board.occupied_co[color]
+        shifts = MATERIAL_SHIFT[color]
+        for piece_type, mask in ((chess.PAWN, board.pawns), (chess.KNIGHT, board.knights),
+                                 (chess.BISHOP, board.bishops), (chess.ROOK, board.rooks),
+                                 (chess.QUEEN, board.queens)):
+            key += (mask & occupied).bit_count() << shifts[piece_type]
+    return key
+
+
+def move_delta(board, move):
+    """
+    Change in material_key caused by `move`, call before board.push(move).
+    Only captures and promotions change it.
+    """
+    delta = 0
+    if move.promotion:
+        shifts = MATERIAL_SHIFT[board.turn]
+        delta += (1 << shifts[move.promotion]) - (1 << shifts[chess.PAWN])
+
+    captured_type = board.piece_type_at(move.to_square)
+    if captured_type:
+        # castling in chess960 "captures" our own rook
+        if board.color_at(move.to_square) != board.turn:
+            delta -= 1 << MATERIAL_SHIFT[not board.turn][captured_type]
+    elif move.to_square == board.ep_square and board.piece_type_at(move.from_square) == chess.PAWN:
+        delta -= 1 << MATERIAL_SHIFT[not board.turn][chess.PAWN]
+    return delta
+
+
+def counts(key):
+    """counts[color][piece_type] for a signature"""
+    return [[0] + [(key >> MATERIAL_SHIFT[color][piece_type]) & COUNT_MASK for piece_type in chess.PIECE_TYPES[:5]]
+            for color in (chess.BLACK, chess.WHITE)]
+
+
+def scale_factor(ours, theirs):
+    """
+    How much of our advantage is real if we're the side ahead. Without
+    pawns a small material edge usually isn't enough to mate.
+    """
+    if ours[chess.PAWN]:
+        return SCALE_NORMAL
+    our_pieces = sum(ours[piece_type] * PIECE_VALUES[piece_type] for piece_type in PHASE_WEIGHTS)
+    their_pieces = sum(theirs[piece_type] * PIECE_VALUES[piece_type] for piece_type in PHASE_WEIGHTS)
+    if our_pieces - their_pieces > PIECE_VALUES[chess.BISHOP]:
+        return SCALE_NORMAL
+    if our_pieces < PIECE_VALUES[chess.ROOK]:
+        return 0
+    return 4 if their_pieces <= PIECE_VALUES[chess.BISHOP] else 14
+
+
+def is_known_draw(white, black):
+    """
+    Nobody can mate: no pawns, rooks or queens, one side has a bare king and
+    the other at most one minor piece or two knights
+    """
+    for side in (white, black):
+        if side[chess.PAWN] or side[chess.ROOK] or side[chess.QUEEN]:
+            return False
+    for ours, theirs in ((white, black), (black, white)):
+        if theirs[chess.KNIGHT] or theirs[chess.BISHOP]:
+            continue
+        minors = ours[chess.KNIGHT] + ours[chess.BISHOP]
+        if minors <= 1 or (ours[chess.KNIGHT] == 2 and not ours[chess.BISHOP]):
+            return True
+    return False
+
+
+def material_entry(key):
+    """
+    (imbalance, phase, white_scale, black_scale, draw) for a signature.
+    imbalance is what the piece-square score doesn't know about (the bishop
+    pair), white positive.
+    """
+    entry = _table.get(key)
+    if entry is not None:
+        return entry
+
+    black, white = counts(key)
+    imbalance = BISHOP_PAIR * ((white[chess.BISHOP] >= 2) - (black[chess.BISHOP] >= 2))
+    phase = min(MAX_PHASE, sum((white[piece_type] + black[piece_type]) * weight
+                               for piece_type, weight in PHASE_WEIGHTS.items()))
+    draw = is_known_draw(white, black)
+    entry = (imbalance, phase, scale_factor(white, black), scale_factor(black, white), draw)
+    _table[key] = entry
+    return entry
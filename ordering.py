@@ -0,0 +1,134 @@
+# quiet move ordering tables for TreeEngine: killers, history and countermoves
+import chess
+from array import array
+from see import mvv_lva, see, is_good_capture
+from transposition import encode_move, decode_move
+
+MAX_PLY = 128
+HISTORY_MAX = 60000
+
+
+class MoveOrdering:
+    def __init__(self):
+        # two killer slots per ply, moves packed with encode_move
+        self.killers = array('H', [0]) * (2 * MAX_PLY)
+        # butterfly table indexed by [side][from][to]
+        self.history = array('i', [0]) * (2 * 64 * 64)
+        # best reply to the previous move, indexed by its [from][to]
+        self.countermoves = array('H', [0]) * (64 * 64)
+
+    def clear(self):
+        self.killers = array('H', [0]) * (2 * MAX_PLY)
+        self.history = array('i', [0]) * (2 * 64 * 64)
+        self.countermoves = array('H', [0]) * (64 * 64)
+
+    def age(self):
+        """
+        Called between iterations, old history still helps but the new
+        depth's cutoffs should count for more
+        """
+        history = self.history
+        for i in range(len(history)):
+            if history[i]:
+                history[i] >>= 1
+
+    def new_search(self, plies_played):
+        """
+        Keep the tables between searches in the same game. History and
+        countermoves don't care where the root is, killers are per ply so
+        they move up by the number of plies played since the last search.
+        """
+        self.age()
+        if plies_played <= 0:
+            return
+        shift = 2 * min(plies_played, MAX_PLY)
+        self.killers = self.killers[shift:] + array('H', [0]) * shift
+
+    def is_killer(self, move, ply):
+        if ply >= MAX_PLY:
+            return False
+        packed = encode_move(move)
+        return self.killers[2 * ply] == packed or self.killers[2 * ply + 1] == packed
+
+    def update(self, board, move, depth, ply):
+        """
+        A quiet move caused a beta cutoff, remember it
+        """
+        packed = encode_move(move)
+        if ply < MAX_PLY and self.killers[2 * ply] != packed:
+            self.killers[2 * ply + 1] = self.killers[2 * ply]
+            self.killers[2 * ply] = packed
+
+        index = (board.turn * 64 + move.from_square) * 64 + move.to_square
+        self.history[index] += depth * depth
+        if self.history[index] > HISTORY_MAX:
+            self.age()
+
+        if board.move_stack:
+            previous = board.move_stack[-1]
+            self.countermoves[previous.from_square * 64 + previous.to_square] = packed
+
+    def staged_moves(self, board, hash_move, ply, attacks=None):
+        """
+        Yield the legal moves one stage at a time: hash move, winning and
+        even captures, killers and the countermove, the other quiet moves by
+        history, then losing captures. A stage is only generated and sorted
+        once the search actually gets to it, so a cutoff on the hash move
+        costs no move generation at all.
+        attacks: the node's AttackMap, quiet pieces stepping onto squares
+        enemy pawns attack go last
+        """
+        if hash_move is not None and board.is_legal(hash_move):
+            yield hash_move
+        else:
+            hash_move = None
+
+        # captures, split by SEE
+        good_captures = []
+        bad_captures = []
+        for move in board.generate_legal_captures():
+            if move == hash_move:
+                continue
+            if is_good_capture(board, move, attacks):
+                good_captures.append(move)
+            else:
+                bad_captures.append(move)
+        good_captures.sort(key=lambda move: mvv_lva(board, move), reverse=True)
+        yield from good_captures
+
+        # refutations, still have to be legal quiet moves in this position
+        refutations = []
+        if ply < MAX_PLY:
+            refutations = [self.killers[2 * ply], self.killers[2 * ply + 1]]
+        if board.move_stack:
+            previous = board.move_stack[-1]
+            refutations.append(self.countermoves[previous.from_square * 64 + previous.to_square])
+        tried = [hash_move]
+        for packed in refutations:
+            move = decode_move(packed)
+            if (move is None or move in tried or board.is_capture(move)
+                    or not board.is_legal(move)):
+                continue
+            tried.append(move)
+            yield move
+
+        # everything else that doesn't take anything
+        turn_index = board.turn * 64
+        history = self.history
+        quiets = []
+        for move in board.generate_legal_moves(chess.BB_ALL, ~board.occupied_co[not board.turn] & chess.BB_ALL):
+            if move in tried or (board.ep_square is not None and board.is_en_passant(move)):
+                continue
+            quiets.append(move)
+        if attacks is None:
+            quiets.sort(key=lambda move: history[(turn_index + move.from_square) * 64 + move.to_square], reverse=True)
+        else:
+            hanging = attacks.by_type[not board.turn][chess.PAWN]
+            pieces = board.occupied_co[board.turn] & ~board.pawns
+            quiets.sort(key=lambda move: history[(turn_index + move.from_square) * 64 + move.to_square]
+                        - (HISTORY_MAX if hanging & chess.BB_SQUARES[move.to_square]
+                           and pieces & chess.BB_SQUARES[move.from_square] else 0), reverse=True)
+        yield from quiets
+
+        bad_captures.sort(key=lambda move: see(board, move), reverse=True)
+        yield from bad_captures
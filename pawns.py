@@ -0,0 +1,131 @@
+# pawn structure evaluation, cached by a pawn-only zobrist key since the
+# pawns hardly change over a search
+import chess
+from array import array
+
+DOUBLED_PENALTY = 10
+ISOLATED_PENALTY = 15
+BACKWARD_PENALTY = 8
+# by rank from the pawn's own side, on top of pawn_advance
+PASSED_BONUS = [0, 5, 10, 20, 35, 60, 100, 0]
+# a passer with another one on a neighbouring file gets half its bonus again
+
+ADJACENT_FILES = [(chess.BB_FILES[file - 1] if file > 0 else 0) | (chess.BB_FILES[file + 1] if file < 7 else 0)
+                  for file in range(8)]
+
+
+def _ranks_ahead(color, rank):
+    """Every rank in front of `rank` from color's point of view"""
+    mask = 0
+    for r in (range(rank + 1, 8) if color == chess.WHITE else range(rank)):
+        mask |= chess.BB_RANKS[r]
+    return mask
+
+
+# squares an enemy pawn would have to be on to stop a pawn on square,
+# PASSED_MASKS[color][square]
+PASSED_MASKS = [[(chess.BB_FILES[chess.square_file(square)] | ADJACENT_FILES[chess.square_file(square)])
+                 & _ranks_ahead(color, chess.square_rank(square))
+                 for square in chess.SQUARES]
+                for color in (chess.BLACK, chess.WHITE)]
+
+# squares our own pawns could defend a pawn on square from, level or
+# behind on the adjacent files, SUPPORT_MASKS[color][square]
+SUPPORT_MASKS = [[ADJACENT_FILES[chess.square_file(square)]
+                  & ~_ranks_ahead(color, chess.square_rank(square))
+                  for square in chess.SQUARES]
+                 for color in (chess.BLACK, chess.WHITE)]
+
+
+def pawn_attacks(color, pawns):
+    """Every square attacked by these pawns"""
+    if color == chess.WHITE:
+        return ((pawns & ~chess.BB_FILE_A) << 7 | (pawns & ~chess.BB_FILE_H) << 9) & chess.BB_ALL
+    return (pawns & ~chess.BB_FILE_A) >> 9 | (pawns & ~chess.BB_FILE_H) >> 7
+
+
+def side_structure(color, ours, theirs):
+    """Pawn structure score of one side, bigger is better for color"""
+    score = 0
+    their_attacks = pawn_attacks(not color, theirs)
+    passed_masks = PASSED_MASKS[color]
+    support_masks = SUPPORT_MASKS[color]
+    passers = 0
+
+    for file in range(8):
+        on_file = (ours & chess.BB_FILES[file]).bit_count()
+        if on_file > 1:
+            score -= DOUBLED_PENALTY * (on_file - 1)
+
+    bb = ours
+    while bb:
+        square = (bb & -bb).bit_length() - 1
+        bb &= bb - 1
+        file = square & 7
+        rank = square >> 3
+
+        if not ours & ADJACENT_FILES[file]:
+            score -= ISOLATED_PENALTY
+        elif not ours & support_masks[square]:
+            # nobody can come up beside it, and it can't go forward safely
+            stop_square = square + 8 if color == chess.WHITE else square - 8
+            if their_attacks & chess.BB_SQUARES[stop_square]:
+                score -= BACKWARD_PENALTY
+
+        if not theirs & passed_masks[square]:
+            passers |= chess.BB_SQUARES[square]
+            score += PASSED_BONUS[rank if color == chess.WHITE else 7 - rank]
+
+    # passers side by side on neighbouring files support each other
+    bb = passers
+    while bb:
+        square = (bb & -bb).bit_length() - 1
+        bb &= bb - 1
+        if passers & ADJACENT_FILES[square & 7]:
+            rank = square >> 3
+            score += PASSED_BONUS[rank if color == chess.WHITE else 7 - rank] // 2
+    return score
+
+
+def pawn_structure(board):
+    """Pawn structure score of the position (positive is good for white)"""
+    white = board.pawns & board.occupied_co[chess.WHITE]
+    black = board.pawns & board.occupied_co[chess.BLACK]
+    return side_structure(chess.WHITE, white, black) - side_structure(chess.BLACK, black, white)
+
+
+class PawnTable:
+    def __init__(self, entries=1 << 14):
+        """
+        entries: number of slots, a power of two. Pawn structures repeat so
+        much inside a search that a small table is plenty.
+        """
+        self.mask = entries - 1
+        self.keys = array('Q', [0]) * entries
+        self.scores = array('i', [0]) * entries
+        self.probes = 0
+        self.hits = 0
+
+    def clear(self):
+        self.keys = array('Q', [0]) * len(self.keys)
+        self.scores = array('i', [0]) * len(self.scores)
+        self.probes = 0
+        self.hits = 0
+
+    def score(self, board, key):
+        """
+        Pawn structure score for board, computed only if key isn't cached
+        key: zobrist.pawn_hash(board)
+        """
+        self.probes += 1
+        index = key & self.mask
+        if self.keys[index] == key:
+            self.hits += 1
+            return self.scores[index]
+        score = pawn_structure(board)
+        self.keys[index] = key
+        self.scores[index] = score
+        return score
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
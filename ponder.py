@@ -0,0 +1,89 @@
+# pondering: keep searching the reply we expect while the opponent thinks
+import multiprocessing
+import queue
+from smp import helper_main
+from transposition import TranspositionTable
+
+
+class Ponderer:
+    def __init__(self, engine):
+        """
+        engine: the TreeEngine to ponder for. The ponder search runs in its
+        own process and writes into the engine's table, so the table is
+        moved into shared memory if it isn't there already.
+        """
+        self.engine = engine
+        self.own_tt = engine.tt.shm is None
+        if self.own_tt:
+            engine.tt = TranspositionTable(engine.tt.size_mb, shared=True)
+
+        self.stop_event = multiprocessing.Event()
+        self.jobs = multiprocessing.Queue()
+        self.results = multiprocessing.Queue()
+        self.process = multiprocessing.Process(
+            target=helper_main,
+            args=(0, engine.tt.shm.name, engine.tt.size_mb, self.jobs, self.results, self.stop_event,
+                  engine.tablebase.path if engine.tablebase is not None else None),
+            daemon=True)
+        self.process.start()
+
+        self.expected_move = None
+        self.search_id = 0
+        self.ponders = 0
+        self.hits = 0
+
+    def start(self, board):
+        """
+        Call right after the engine played its move on board, starts
+        searching the position after the reply the engine's PV expects
+        """
+        pv = self.engine.pv
+        if (len(pv) < 2 or not board.move_stack or pv[0] != board.peek() or not board.is_legal(pv[1])
+                or not self.process.is_alive()):
+            self.expected_move = None
+            return
+
+        self.expected_move = pv[1]
+        self.ponders += 1
+        self.search_id += 1
+        self.stop_event.clear()
+        moves = [move.uci() for move in board.move_stack] + [self.expected_move.uci()]
+        self.jobs.put((self.search_id, board.root().fen(), moves, None, self.engine.max_depth))
+
+    def stop(self, board):
+        """
+        Call once the opponent has moved. On a ponder hit the engine's next
+        search starts with everything the ponder search put in the table,
+        on a miss whatever it found is thrown away.
+        Returns True on a hit.
+        """
+        if self.expected_move is None:
+            return False
+
+        # wait for this ponder search to actually end, so the next one
+        # doesn't clear the stop flag under it
+        self.stop_event.set()
+        while self.process.is_alive():
+            try:
+                if self.results.get(timeout=1.0)[0] == self.search_id:
+                    break
+            except queue.Empty:
+                break
+
+        hit = bool(board.move_stack) and board.peek() == self.expected_move
+        if hit:
+            self.hits += 1
+        self.expected_move = None
+        return hit
+
+    def hit_rate(self):
+        """Fraction of ponder searches where the opponent played the expected move"""
+        return self.hits / self.ponders if self.ponders else 0.0
+
+    def close(self):
+        """Shut the ponder process down, and free the table if we made it shared"""
+        self.stop_event.set()
+        self.jobs.put(None)
+        self.process.join(timeout=1.0)
+        if self.own_tt:
+            self.engine.tt.close()
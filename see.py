@@ -0,0 +1,89 @@
+# static exchange evaluation and capture ordering
+import chess
+from evaluation import PIECE_VALUES
+
+# least valuable attacker first
+ATTACKER_ORDER = [chess.PAWN, chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN, chess.KING]
+
+
+def captured_value(board, move):
+    """Value of the piece taken by a capture (en passant takes a pawn)"""
+    piece_type = board.piece_type_at(move.to_square)
+    if piece_type is None:
+        return PIECE_VALUES[chess.PAWN] if board.is_en_passant(move) else 0
+    return PIECE_VALUES[piece_type]
+
+
+def mvv_lva(board, move):
+    """
+    Most valuable victim, least valuable attacker. Bigger is better.
+    """
+    attacker = board.piece_type_at(move.from_square)
+    victim = captured_value(board, move)
+    if move.promotion:
+        victim += PIECE_VALUES[move.promotion] - PIECE_VALUES[chess.PAWN]
+    return victim * 10 - attacker
+
+
+def see(board, move):
+    """
+    Static exchange evaluation, material the side to move expects to win
+    with this capture if both sides keep recapturing on the target square
+    with their least valuable piece. Ignores pins.
+    """
+    to_square = move.to_square
+    from_bb = chess.BB_SQUARES[move.from_square]
+
+    occupied = board.occupied ^ from_bb
+    if board.is_en_passant(move):
+        occupied ^= chess.BB_SQUARES[to_square - 8 if board.turn == chess.WHITE else to_square + 8]
+
+    gain = [captured_value(board, move)]
+    if move.promotion:
+        gain[0] += PIECE_VALUES[move.promotion] - PIECE_VALUES[chess.PAWN]
+        on_square = PIECE_VALUES[move.promotion]
+    else:
+        on_square = PIECE_VALUES[board.piece_type_at(move.from_square)]
+
+    piece_masks = [board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings]
+    side = not board.turn
+    while True:
+        attackers = (board.attackers_mask(chess.WHITE, to_square, occupied)
+                     | board.attackers_mask(chess.BLACK, to_square, occupied)) & occupied
+        ours = attackers & board.occupied_co[side]
+        if not ours:
+            break
+
+        for piece_type, mask in zip(ATTACKER_ORDER, piece_masks):
+            lva = ours & mask
+            if lva:
+                break
+
+        # the king can only take last, when nothing defends the square
+        if piece_type == chess.KING and attackers & board.occupied_co[not side]:
+            break
+
+        gain.append(on_square - gain[-1])
+        on_square = PIECE_VALUES[piece_type]
+        occupied ^= lva & -lva
+        side = not side
+
+    while len(gain) > 1:
+        last = gain.pop()
+        gain[-1] = -max(-gain[-1], last)
+    return gain[0]
+
+
+def is_good_capture(board, move, attacks=None):
+    """
+    Cheap test for see(board, move) >= 0, taking something at least as
+    valuable as the attacker can never lose material, and neither can
+    taking something nobody defends
+    attacks: the node's AttackMap if it has one
+    """
+    attacker = board.piece_type_at(move.from_square)
+    if attacker == chess.KING or captured_value(board, move) >= PIECE_VALUES[attacker]:
+        return True
+    if attacks is not None and not attacks.is_defended(board, move):
+        return True
+    return see(board, move) >= 0
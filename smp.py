@@ -0,0 +1,124 @@
+# lazy SMP: several processes search the same root and share one
+# transposition table, the main process plays the deepest result
+import multiprocessing
+import queue
+import time
+import chess
+from engines import TreeEngine
+from timeman import TimeManager
+from transposition import TranspositionTable
+
+
+def helper_main(helper_id, shm_name, hash_size_mb, jobs, results, stop_event, tablebase=None):
+    """
+    Runs in each helper process: search whatever root the main process
+    sends until told to quit with None. Every result carries the id of
+    the search it belongs to.
+    tablebase: syzygy directory, the same one the main process probes
+    """
+    tt = TranspositionTable(hash_size_mb, shared_name=shm_name)
+    engine = TreeEngine(tt=tt, tablebase=tablebase)
+    engine.time_manager = TimeManager(stop_event=stop_event)
+
+    try:
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            search_id, fen, moves, time_limit, max_depth = job
+
+            board = chess.Board(fen)
+            for move in moves:
+                board.push(chess.Move.from_uci(move))
+            engine.max_depth = max_depth
+
+            # odd helpers start a ply deeper so the processes don't all
+            # finish the same iterations at the same time
+            start_depth = 1 + helper_id % 2
+            move, score = engine.iterative_deepening(board, time_limit, start_depth)
+
+            depth = engine.iteration_stats[-1][0] if engine.iteration_stats else 0
+            nodes = sum(stats[1] + stats[2] for stats in engine.iteration_stats)
+            results.put((search_id, helper_id, depth, move.uci() if move else None, score, nodes))
+    finally:
+        tt.close()
+
+
+class SMPTreeEngine(TreeEngine):
+    def __init__(self, workers=4, hash_size_mb=16, book=None, tablebase=None):
+        """
+        workers: total number of searching processes, this one included
+        """
+        super().__init__(tt=TranspositionTable(hash_size_mb, shared=True), book=book, tablebase=tablebase)
+        self.name = "SMPTreeEngine"
+        self.workers = workers
+        self.helper_nodes = 0
+        self.completed_depth = 0
+        self.search_id = 0
+
+        self.stop_event = multiprocessing.Event()
+        self.jobs = []
+        self.results = multiprocessing.Queue()
+        self.helpers = []
+        for helper_id in range(1, workers):
+            jobs = multiprocessing.Queue()
+            process = multiprocessing.Process(
+                target=helper_main,
+                args=(helper_id, self.tt.shm.name, hash_size_mb, jobs, self.results, self.stop_event, tablebase),
+                daemon=True)
+            process.start()
+            self.jobs.append(jobs)
+            self.helpers.append(process)
+
+    def iterative_deepening(self, board, time_limit, start_depth=1):
+        """
+        Start the helpers on this root, search it here too, then stop them
+        and play the move from whoever completed the deepest iteration. A
+        tablebase or only legal move found here always stands.
+        """
+        self.stop_event.clear()
+        self.search_id += 1
+        job = (self.search_id, board.root().fen(), [move.uci() for move in board.move_stack],
+               time_limit, self.max_depth)
+        # a helper that died is left out for good
+        working = 0
+        for jobs, process in zip(self.jobs, self.helpers):
+            if process.is_alive():
+                jobs.put(job)
+                working += 1
+
+        best_move, best_eval = super().iterative_deepening(board, time_limit, start_depth)
+        best_depth = self.iteration_stats[-1][0] if self.iteration_stats else 0
+
+        # our own search is done, everyone else can stop too
+        self.stop_event.set()
+        self.helper_nodes = 0
+        deadline = time.monotonic() + 1.0
+        while working:
+            try:
+                search_id, helper_id, depth, move, score, nodes = self.results.get(
+                    timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if search_id != self.search_id:
+                continue  # came in too late for an earlier search
+            working -= 1
+            self.helper_nodes += nodes
+            if move is None or self.root_decided or depth <= best_depth:
+                continue
+            move = chess.Move.from_uci(move)
+            if board.is_legal(move):
+                best_move, best_eval, best_depth = move, score, depth
+        self.completed_depth = best_depth
+
+        return best_move, best_eval
+
+    def close(self):
+        """Shut the helper processes down and free the shared table"""
+        for jobs in self.jobs:
+            jobs.put(None)
+        for process in self.helpers:
+            process.join(timeout=1.0)
+        self.helpers = []
+        self.jobs = []
+        self.tt.close()
@@ -0,0 +1,112 @@
+# syzygy endgame tablebases, opened once per process like the opening book
+import collections
+import chess
+import chess.syzygy
+from ordering import MAX_PLY
+from transposition import MATE_BOUND, EXACT, LOWER, UPPER
+
+# tablebase wins score below every mate score, the search can still find
+# the actual mate on top of a known win
+TB_WIN = MATE_BOUND - MAX_PLY - 1
+
+_tablebases = {}
+_MISSING = object()
+
+
+def open_tablebase(path):
+    """Syzygy tablebase for the directory at path, opened on first use"""
+    tablebase = _tablebases.get(path)
+    if tablebase is None:
+        tablebase = chess.syzygy.open_tablebase(path)
+        _tablebases[path] = tablebase
+    return tablebase
+
+
+def tb_score(wdl, ply):
+    """
+    Search score and bound for a WDL result from the side to move's point of
+    view. A known win is at least TB_WIN (there may be a faster mate), cursed
+    wins and blessed losses are draws under the 50 move rule.
+    """
+    if wdl == 2:
+        return TB_WIN - ply, LOWER
+    if wdl == -2:
+        return -TB_WIN + ply, UPPER
+    return wdl, EXACT
+
+
+class TablebaseProbe:
+    def __init__(self, path, cache_size=1 << 16):
+        """
+        path: directory with the .rtbw/.rtbz files
+        cache_size: positions whose WDL result is remembered, least
+        recently used ones are dropped first
+        """
+        self.path = path
+        self.tablebase = open_tablebase(path)
+        # "KRvK" is a 3 piece table
+        self.max_pieces = max((len(name) - 1 for name in self.tablebase.wdl), default=0)
+        self.cache = collections.OrderedDict()
+        self.cache_size = cache_size
+        self.probes = 0
+        self.cache_hits = 0
+
+    def can_probe(self, board):
+        """
+        Few enough pieces, no castling rights, and right after a capture or
+        pawn move since WDL assumes the 50 move counter was just reset
+        """
+        return (board.occupied.bit_count() <= self.max_pieces and not board.castling_rights
+                and board.halfmove_clock == 0)
+
+    def probe_wdl(self, board, key):
+        """
+        WDL for the side to move, or None if the table isn't there
+        key: Zobrist hash of board
+        """
+        self.probes += 1
+        wdl = self.cache.get(key, _MISSING)
+        if wdl is not _MISSING:
+            self.cache_hits += 1
+            self.cache.move_to_end(key)
+            return wdl
+
+        wdl = self.tablebase.get_wdl(board)
+        self.cache[key] = wdl
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return wdl
+
+    def root_move(self, board):
+        """
+        Pick the root move from DTZ: the best WDL, then among wins the move
+        that gets to the next capture, pawn move or mate fastest, and among
+        losses the one that holds out longest. Returns (move, wdl) or None.
+        """
+        if board.occupied.bit_count() > self.max_pieces or board.castling_rights:
+            return None
+
+        best_move = None
+        best_key = None
+        best_wdl = None
+        for move in board.legal_moves:
+            board.push(move)
+            wdl = self.tablebase.get_wdl(board)
+            dtz = self.tablebase.get_dtz(board)
+            board.pop()
+            if wdl is None or dtz is None:
+                return None
+
+            # both are from the opponent's point of view after the move
+            wdl = -wdl
+            if wdl > 0:
+                key = (wdl, -abs(dtz))
+            elif wdl < 0:
+                key = (wdl, abs(dtz))
+            else:
+                key = (0, 0)
+            if best_key is None or key > best_key:
+                best_move, best_key, best_wdl = move, key, wdl
+        if best_move is None:
+            return None
+        return best_move, best_wdl
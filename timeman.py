@@ -0,0 +1,68 @@
+# time management for TreeEngine
+import threading
+import time
+
+NS_PER_SECOND = 1000000000
+
+
+class TimeManager:
+    def __init__(self, soft_ratio=0.6, hard_ratio=0.95, check_every=128, stop_event=None):
+        """
+        soft_ratio: fraction of the time after which no new iteration starts
+        hard_ratio: fraction of the time after which the search is aborted
+        check_every: nodes between clock reads, must be a power of two
+        stop_event: a flag shared with other processes, cleared by whoever
+        owns it rather than at every start()
+        """
+        self.soft_ratio = soft_ratio
+        self.hard_ratio = hard_ratio
+        self.check_mask = check_every - 1
+
+        self.start_ns = 0
+        self.soft_ns = 0
+        self.hard_ns = 0
+        self.stopped = False
+        # set from any thread to end the search early
+        self.owns_stop_event = stop_event is None
+        self.stop_event = threading.Event() if stop_event is None else stop_event
+
+    def start(self, time_limit):
+        """Start the clock for a search of time_limit seconds (None for no limit)"""
+        self.start_ns = time.monotonic_ns()
+        if time_limit is None:
+            self.soft_ns = self.hard_ns = float('inf')
+        else:
+            budget = time_limit * NS_PER_SECOND
+            self.soft_ns = self.start_ns + int(budget * self.soft_ratio)
+            self.hard_ns = self.start_ns + int(budget * self.hard_ratio)
+        self.stopped = False
+        if self.owns_stop_event:
+            self.stop_event.clear()
+
+    def elapsed(self):
+        """Seconds since start()"""
+        return (time.monotonic_ns() - self.start_ns) / NS_PER_SECOND
+
+    def out_of_time(self):
+        """
+        Called by the search every check_every nodes, True once the hard
+        limit has passed or someone called stop()
+        """
+        if not self.stopped and (self.stop_event.is_set() or time.monotonic_ns() >= self.hard_ns):
+            self.stopped = True
+        return self.stopped
+
+    def stop(self):
+        """Ask the running search to stop, safe to call from another thread"""
+        self.stop_event.set()
+
+    def start_iteration(self, stable_iterations):
+        """
+        Is it worth starting another iteration? The more iterations in a row
+        the best move has stayed the same, the earlier we give up, since the
+        next one probably won't change it either.
+        """
+        if self.stopped or self.stop_event.is_set():
+            return False
+        scale = max(0.4, 1.0 - 0.15 * stable_iterations)
+        return time.monotonic_ns() < self.start_ns + (self.soft_ns - self.start_ns) * scale
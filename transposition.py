@@ -0,0 +1,173 @@
+# transposition table for TreeEngine, fixed size and kept in flat arrays
+import chess
+from array import array
+from multiprocessing import shared_memory
+
+EXACT = 0
+LOWER = 1  # fail high, real score is at least the stored one
+UPPER = 2  # fail low, real score is at most the stored one
+
+MATE_SCORE = 10000
+MATE_BOUND = MATE_SCORE - 1000  # anything above this is a mate score
+WIN_BOUND = MATE_BOUND - 2 * 128 - 1  # tablebase.TB_WIN - MAX_PLY, anything above this is a mate or a tablebase win
+INFINITY = 30000  # search window bounds, stays inside the packed score field
+
+ENTRY_BYTES = 16  # one 64 bit key (XOR data) + one 64 bit packed data word
+
+# data word layout (low to high bits):
+#   move   16 bits  from(6) | to(6) | promotion(3)
+#   score  20 bits  stored with SCORE_OFFSET so it stays positive
+#   depth   8 bits
+#   bound   2 bits
+#   age     8 bits
+SCORE_OFFSET = 1 << 19
+
+
+def encode_move(move):
+    """Pack a move into 16 bits (0 means no move)"""
+    if move is None:
+        return 0
+    return move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12)
+
+
+def decode_move(packed):
+    """Unpack a move packed by encode_move"""
+    if packed == 0:
+        return None
+    promotion = (packed >> 12) & 7
+    return chess.Move(packed & 63, (packed >> 6) & 63, promotion or None)
+
+
+def score_to_tt(score, ply):
+    """Mate and tablebase win scores are stored relative to the node, not the root"""
+    if score >= WIN_BOUND:
+        return score + ply
+    if score <= -WIN_BOUND:
+        return score - ply
+    return score
+
+
+def score_from_tt(score, ply):
+    if score >= WIN_BOUND:
+        return score - ply
+    if score <= -WIN_BOUND:
+        return score + ply
+    return score
+
+
+class TranspositionTable:
+    def __init__(self, size_mb=16, shared=False, shared_name=None):
+        """
+        size_mb: table size, rounded down to a power of two entries
+        shared: put the table in a new shared memory block, other processes
+        can attach to it by its name (self.shm.name), see smp.py
+        shared_name: attach to a table another process created that way
+        """
+        entries = max(1, (size_mb * 1024 * 1024) // ENTRY_BYTES)
+        self.size_mb = size_mb
+        self.size = 1 << (entries.bit_length() - 1)
+        self.mask = self.size - 1
+        self.age_index = 2 * self.size  # one extra word at the end holds the age
+        self.shm = None
+        self.owner = shared_name is None
+
+        # slot i is table[2i] = key ^ data, table[2i + 1] = data. The XOR
+        # lets other processes write without locks, a torn entry simply
+        # doesn't match its key any more.
+        if shared or shared_name is not None:
+            self.shm = shared_memory.SharedMemory(name=shared_name, create=shared_name is None,
+                                                  size=(2 * self.size + 1) * 8)
+            self.table = self.shm.buf.cast('Q')
+        else:
+            self.table = array('Q', [0]) * (2 * self.size + 1)
+        self.age = self.table[self.age_index]
+
+        self.probes = 0
+        self.hits = 0
+
+    def close(self):
+        """Let go of the shared memory, the owner also frees it"""
+        if self.shm is None:
+            return
+        self.table.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+        self.shm = None
+
+    def clear(self):
+        """Wipe every entry"""
+        if self.shm is None:
+            self.table = array('Q', [0]) * (2 * self.size + 1)
+        else:
+            self.shm.buf[:] = bytes(self.shm.size)
+        self.age = 0
+
+    def new_search(self):
+        """
+        Bump the age so entries from older searches get replaced first.
+        Processes sharing someone else's table pick up the owner's age.
+        """
+        if self.owner:
+            self.age = (self.age + 1) & 0xFF
+            self.table[self.age_index] = self.age
+        else:
+            self.age = self.table[self.age_index]
+        self.probes = 0
+        self.hits = 0
+
+    def probe(self, key):
+        """
+        Look up a position, returns (depth, bound, score, move) or None
+        """
+        self.probes += 1
+        index = 2 * (key & self.mask)
+        data = self.table[index + 1]
+        if data == 0 or self.table[index] ^ data != key:
+            return None
+
+        self.hits += 1
+        move = decode_move(data & 0xFFFF)
+        score = ((data >> 16) & 0xFFFFF) - SCORE_OFFSET
+        depth = (data >> 36) & 0xFF
+        bound = (data >> 44) & 3
+        return depth, bound, score, move
+
+    def store(self, key, depth, bound, score, move):
+        """
+        Store a search result. An existing entry for another position is only
+        replaced if it is from an older search or was searched less deeply.
+        """
+        index = 2 * (key & self.mask)
+        old_data = self.table[index + 1]
+        same_key = old_data and self.table[index] ^ old_data == key
+        if old_data and (old_data >> 46) == self.age:
+            old_depth = (old_data >> 36) & 0xFF
+            if not same_key:
+                if old_depth > depth:
+                    return
+            elif old_depth > depth + 2 and bound != EXACT:
+                # a much deeper result for the same position is worth more
+                return
+        if same_key and move is None:
+            # same position, don't lose the best move we already know about
+            move = decode_move(old_data & 0xFFFF)
+
+        depth = max(0, min(depth, 255))
+        data = (encode_move(move)
+                | ((score + SCORE_OFFSET) << 16)
+                | (depth << 36)
+                | (bound << 44)
+                | (self.age << 46))
+        self.table[index] = key ^ data
+        self.table[index + 1] = data
+
+    def hashfull(self):
+        """Permille of the first thousand slots used by the current search"""
+        sample = min(1000, self.size)
+        used = 0
+        for i in range(sample):
+            data = self.table[2 * i + 1]
+            if data and (data >> 46) == self.age:
+                used += 1
+        return used * 1000 // sample
@@ -0,0 +1,148 @@
+# incremental polyglot zobrist hashing, same keys as chess.polyglot.zobrist_hash
+# so the search can share them with opening books
+import chess
+import chess.polyglot
+
+RANDOM = chess.polyglot.POLYGLOT_RANDOM_ARRAY
+
+# PIECE_KEYS[color][piece_type][square], polyglot puts black before white
+PIECE_KEYS = [
+    [[0] * 64] + [[RANDOM[64 * ((piece_type - 1) * 2 + color) + square] for square in chess.SQUARES]
+                  for piece_type in chess.PIECE_TYPES]
+    for color in (chess.BLACK, chess.WHITE)
+]
+TURN_KEY = RANDOM[780]
+EP_KEYS = [RANDOM[772 + file] for file in range(8)]
+HASHER = chess.polyglot.ZobristHasher(RANDOM)
+
+CASTLING_CORNERS = [
+    (chess.BB_H1, RANDOM[768]),
+    (chess.BB_A1, RANDOM[768 + 1]),
+    (chess.BB_H8, RANDOM[768 + 2]),
+    (chess.BB_A8, RANDOM[768 + 3]),
+]
+
+
+def full_hash(board):
+    """Hash from scratch, only needed at the root and for debugging"""
+    return chess.polyglot.zobrist_hash(board)
+
+
+def castling_hash(board):
+    if not board.castling_rights:
+        return 0
+    if board.chess960:
+        return HASHER.hash_castling(board)
+    rights = board.clean_castling_rights()
+    key = 0
+    for corner, value in CASTLING_CORNERS:
+        if rights & corner:
+            key ^= value
+    return key
+
+
+def ep_hash(board):
+    """
+    Polyglot only hashes the en passant file if a pawn could actually take
+    """
+    ep_square = board.ep_square
+    if ep_square is None:
+        return 0
+    if board.turn == chess.WHITE:
+        ep_mask = chess.shift_down(chess.BB_SQUARES[ep_square])
+    else:
+        ep_mask = chess.shift_up(chess.BB_SQUARES[ep_square])
+    ep_mask = chess.shift_left(ep_mask) | chess.shift_right(ep_mask)
+    if ep_mask & board.pawns & board.occupied_co[board.turn]:
+        return EP_KEYS[ep_square & 7]
+    return 0
+
+
+def castling_squares(board, move):
+    """
+    (king_to, rook_from, rook_to) for a castling move, in either the normal
+    king-two-squares or the chess960 king-takes-rook notation
+    """
+    rank = move.from_square & ~7
+    if board.is_kingside_castling(move):
+        king_to, rook_to = rank + 6, rank + 5
+    else:
+        king_to, rook_to = rank + 2, rank + 3
+    if board.occupied_co[board.turn] & board.rooks & chess.BB_SQUARES[move.to_square]:
+        rook_from = move.to_square
+    else:
+        rook_from = rank + 7 if king_to > move.from_square else rank
+    return king_to, rook_from, rook_to
+
+
+def move_delta(board, move):
+    """
+    XOR delta for the pieces moved by `move`, plus the side to move and the
+    castling/en passant keys of the position before it. Call before
+    board.push(move), then XOR in castling_hash and ep_hash of the new position.
+    """
+    us = board.turn
+    from_square = move.from_square
+    to_square = move.to_square
+    piece_type = board.piece_type_at(from_square)
+    keys = PIECE_KEYS[us]
+
+    delta = TURN_KEY ^ castling_hash(board) ^ ep_hash(board)
+
+    if piece_type == chess.KING and board.is_castling(move):
+        king_to, rook_from, rook_to = castling_squares(board, move)
+        delta ^= keys[chess.KING][from_square] ^ keys[chess.KING][king_to]
+        delta ^= keys[chess.ROOK][rook_from] ^ keys[chess.ROOK][rook_to]
+        return delta
+
+    delta ^= keys[piece_type][from_square]
+    delta ^= keys[move.promotion or piece_type][to_square]
+
+    captured_type = board.piece_type_at(to_square)
+    if captured_type:
+        delta ^= PIECE_KEYS[not us][captured_type][to_square]
+    elif piece_type == chess.PAWN and to_square == board.ep_square:
+        captured_square = to_square - 8 if us == chess.WHITE else to_square + 8
+        delta ^= PIECE_KEYS[not us][chess.PAWN][captured_square]
+
+    return delta
+
+
+def null_move_delta(board):
+    """
+    XOR delta for passing the move, call before board.push(chess.Move.null()).
+    Only the side to move and the en passant file can change.
+    """
+    return TURN_KEY ^ ep_hash(board)
+
+
+def pawn_hash(board):
+    """Key of the pawns alone, for the pawn structure table"""
+    key = 0
+    for color in chess.COLORS:
+        keys = PIECE_KEYS[color][chess.PAWN]
+        bb = board.pawns & board.occupied_co[color]
+        while bb:
+            key ^= keys[(bb & -bb).bit_length() - 1]
+            bb &= bb - 1
+    return key
+
+
+def pawn_move_delta(board, move):
+    """
+    Change in pawn_hash caused by `move`, call before board.push(move).
+    Only pawn moves and captures of pawns change it.
+    """
+    us = board.turn
+    delta = 0
+    from_bb = chess.BB_SQUARES[move.from_square]
+    if board.pawns & from_bb:
+        delta ^= PIECE_KEYS[us][chess.PAWN][move.from_square]
+        if not move.promotion:
+            delta ^= PIECE_KEYS[us][chess.PAWN][move.to_square]
+        if move.to_square == board.ep_square:
+            captured_square = move.to_square - 8 if us == chess.WHITE else move.to_square + 8
+            delta ^= PIECE_KEYS[not us][chess.PAWN][captured_square]
+    if board.pawns & board.occupied_co[not us] & chess.BB_SQUARES[move.to_square]:
+        delta ^= PIECE_KEYS[not us][chess.PAWN][move.to_square]
+    return delta